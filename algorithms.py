@@ -1,32 +1,86 @@
 
+from array import array
+
 from distributedAlgorithm import *
 from graph import *
+from compactGraph import CompactGraph
+from bipartite import twoColoring, sameColorEdge
 
 # message encodings
 PROPOSAL = 1
 ACCEPT = 2
 MATCHED = 3
+
+# states of BipartiteMaximalMatching
+class MatchingState(State):
+    __slots__ = ('r', 'M', 'X', 'i')
+    
+    def __init__(self, name, desc):
+        State.__init__(self, name, desc)
+        self.r = 1
+        self.M = None
+        self.X = None
+        self.i = -1
+        
+# states of MinimumVertexCover3Approximation
+class CoverState(State):
+    __slots__ = ('state1', 'state2', 'output')
+    
+    def __init__(self, name, desc):
+        State.__init__(self, name, desc)
+        
+        # BipartiteMaximalMatching states of nodes V1 and V2 in the virtual network
+        # To be initialized while running the first round
+        self.state1 = None
+        self.state2 = None
+        self.output = -1
         
 class BipartiteMaximalMatching(DistributedAlgorithm):
 
     def input(self):
+        if self.coloring != None:
+            return [1, 2]
+            
         colors = self.graph.colorsInGraph()
         return list(colors)
 
     # Things to check:
     # - Only two colors used
     # - Bipartiness
+    # A graph without colors (all colors 0) is colored automatically if it is bipartite.
+    # The result is cached until the graph changes
     def validateInput(self):
-        twoColors = len(self.input()) == 2
-        bipartiness = True
-        
-        for node in self.graph.nodes:
-            for i in node.portNumbering():
-                (adj, j) = node.getAdjacentByPortNumber(i)
-                if node.color == adj.color:
-                    bipartiness = False
-                    
-        return twoColors and bipartiness
+        (self.coloring, problem) = self.graph.cached('BipartiteMaximalMatching.validateInput', self.checkInput)
+        if problem != None:
+            print(problem)
+        return problem == None
+        
+    # FOR INTERNAL USE ONLY
+    # returns (coloring, problem): coloring is None if the colors of the graph are used,
+    # problem is None if the input is valid
+    def checkInput(self):
+        colors = self.graph.colorsInGraph()
+        if colors == {0}:
+            (coloring, oddCycle) = twoColoring(self.graph)
+            if coloring == None:
+                names = [self.graph.nodeName(node) for node in oddCycle]
+                return (None, 'The graph is not bipartite, odd cycle: ' + ' - '.join(names))
+            return (coloring, None)
+            
+        if len(colors) != 2:
+            return (None, 'The graph has to be colored with two colors or not at all')
+            
+        edge = sameColorEdge(self.graph)
+        if edge != None:
+            names = [self.graph.nodeName(node) for node in edge]
+            return (None, 'Adjacent nodes ' + names[0] + ' and ' + names[1] + ' have the same color')
+            
+        return (None, None)
+        
+    def nodeInput(self, node):
+        if self.coloring != None:
+            return self.coloring[node]
+        return self.graph.nodeColor(node)
         
     def states(self):
         return [self.WUR, self.BUR, self.MR, self.US, self.MS]
@@ -38,7 +92,12 @@ class BipartiteMaximalMatching(DistributedAlgorithm):
         return [PROPOSAL, ACCEPT, MATCHED]
 
     def init(self, name, input_, d):
-        if input_ == min(self.input()):
+    
+        # nodes of the smaller color are white, computed once per run
+        if self.whiteColor == None:
+            self.whiteColor = min(self.input())
+            
+        if input_ == self.whiteColor:
             return self.WUR.copy(self)
         else:
             result = self.BUR.copy(self)
@@ -99,7 +158,7 @@ class BipartiteMaximalMatching(DistributedAlgorithm):
                 
                 result = state.copy(self)
                 result.r += 1
-                result.M.update(proposals)
+                result.M = state.M | proposals
                 result.X = result.X - matched
                 return result
             elif evenRound and (len(state.M) > 0):
@@ -143,28 +202,27 @@ class BipartiteMaximalMatching(DistributedAlgorithm):
     def initializeVirtual(self):
         pass
         
+    # FOR INTERNAL USE ONLY
+    def initializeInternalState(self):
+        self.whiteColor = None
+        return DistributedAlgorithm.initializeInternalState(self)
+        
     def __init__(self, graph):
+        self.whiteColor = None
+        
+        # automatic 2-coloring of an uncolored graph: node -> 1 or 2, see validateInput
+        self.coloring = None
     
         # define the states for the problem
-        self.WUR = State('WUR', 'White unmatched running')
-        self.WUR.r = 1
+        self.WUR = MatchingState('WUR', 'White unmatched running')
         
-        self.BUR = State('BUR', 'Black unmatched running')
-        self.BUR.r = 1
+        self.BUR = MatchingState('BUR', 'Black unmatched running')
         self.BUR.M = set()
         self.BUR.X = set()
         
-        self.MR = State('MR', 'Matched running')
-        self.MR.r = 1
-        self.MR.i = -1
-        
-        self.US = State('US', 'Unmatched stopped')
-
-        self.MS = State('MS', 'Matched stopped')
-        self.MS.i = -1
-        
-        for state in self.states():
-            state.params = lambda: self.paramsByState(state)
+        self.MR = MatchingState('MR', 'Matched running')
+        self.US = MatchingState('US', 'Unmatched stopped')
+        self.MS = MatchingState('MS', 'Matched stopped')
     
         DistributedAlgorithm.__init__(self, "Bipartite Maximal Matching", graph, False)
 
@@ -188,34 +246,34 @@ class MinimumVertexCover3Approximation(DistributedAlgorithm):
     def msg(self):
         result = []
         
-        for msg1 in self.virtualProblem.msg():
-            for msg2 in self.virtualProblem.msg():
+        for msg1 in [PROPOSAL, ACCEPT, MATCHED]:
+            for msg2 in [PROPOSAL, ACCEPT, MATCHED]:
                 result.append( (msg1, msg2) )
                 
         return result
 
     def init(self, name, input_, d):
-        v1 = self.virtualNodeByName(name, 1)
-        v2 = self.virtualNodeByName(name, 2)
+        (v1, v2) = self.virtualNodes(name)
         
         if (v1 == None) or (v2 == None):
             raise Exception('init failed: virtual network structure is incomplete')
             
+        network = self.virtualNetwork
         result = self.BothRunning.copy(self)
-        result.state1 = self.virtualProblem.init(v1.name, v1.color, v1.degree())
-        result.state2 = self.virtualProblem.init(v2.name, v2.color, v2.degree())
+        result.state1 = self.virtualProblem.init(network.nodeName(v1), network.nodeColor(v1), network.nodeDegree(v1))
+        result.state2 = self.virtualProblem.init(network.nodeName(v2), network.nodeColor(v2), network.nodeDegree(v2))
         
         return result
 
     def send(self, nodeName, state, d):
-        v1 = self.virtualNodeByName(nodeName, 1)
-        v2 = self.virtualNodeByName(nodeName, 2)
+        (v1, v2) = self.virtualNodes(nodeName)
         
         if (v1 == None) or (v2 == None):
             raise Exception('send failed: virtual network structure is incomplete')
     
-        v1_msg = self.virtualProblem.send(v1.name, state.state1, v1.degree())
-        v2_msg = self.virtualProblem.send(v2.name, state.state2, v2.degree())
+        network = self.virtualNetwork
+        v1_msg = self.virtualProblem.send(network.nodeName(v1), state.state1, network.nodeDegree(v1))
+        v2_msg = self.virtualProblem.send(network.nodeName(v2), state.state2, network.nodeDegree(v2))
     
         if state.equalTo(self.BothRunning):         
             return (v1_msg, v2_msg)
@@ -238,8 +296,7 @@ class MinimumVertexCover3Approximation(DistributedAlgorithm):
             
             return result
                     
-        v1 = self.virtualNodeByName(nodeName, 1)
-        v2 = self.virtualNodeByName(nodeName, 2)
+        (v1, v2) = self.virtualNodes(nodeName)
         
         if (v1 == None) or (v2 == None):
             raise Exception('can not receive messages: virtual network structure is incomplete')
@@ -262,8 +319,8 @@ class MinimumVertexCover3Approximation(DistributedAlgorithm):
            
         # change state
         if state.equalTo(self.BothRunning): 
-            v1_stopped = stateInStoppingStates(v1_new, self.virtualProblem.output())
-            v2_stopped = stateInStoppingStates(v2_new, self.virtualProblem.output())   
+            v1_stopped = self.virtualProblem.inStoppingState(v1_new)
+            v2_stopped = self.virtualProblem.inStoppingState(v2_new)   
             
             if v1_stopped and v2_stopped:
                 result = bothStoppedState(self, v1_new, v2_new)
@@ -279,7 +336,7 @@ class MinimumVertexCover3Approximation(DistributedAlgorithm):
             return result          
 
         elif state.equalTo(self.V1Running):
-            if stateInStoppingStates(v1_new, self.virtualProblem.output()):
+            if self.virtualProblem.inStoppingState(v1_new):
                 result = bothStoppedState(self, v1_new, v2_new)
             else:
                 result = state.copy(self)
@@ -289,7 +346,7 @@ class MinimumVertexCover3Approximation(DistributedAlgorithm):
             return result 
                  
         elif state.equalTo(self.V2Running):
-            if stateInStoppingStates(v2_new, self.virtualProblem.output()):
+            if self.virtualProblem.inStoppingState(v2_new):
                 result = bothStoppedState(self, v1_new, v2_new)
             else:
                 result = state.copy(self)
@@ -299,6 +356,9 @@ class MinimumVertexCover3Approximation(DistributedAlgorithm):
             return result 
             
         elif state.equalTo(self.BothStopped):
+            # keep the state buffers of the virtual problem complete
+            self.virtualProblem.afterRoundStates[v1] = state.state1
+            self.virtualProblem.afterRoundStates[v2] = state.state2
             return state.copy(self)
  
     def paramsByState(self, state):
@@ -316,54 +376,132 @@ class MinimumVertexCover3Approximation(DistributedAlgorithm):
     def runOneRound(self):
         DistributedAlgorithm.runOneRoundSimulated(self)
         
+    def adoptState(self, state):
+        state.alg = self
+        
+        # the nested states only need the virtual problem for their parameters, so an
+        # instance which has not run (like the main process of parallelEngine) does
+        # without the virtual network
+        if self.virtualProblem == None:
+            self.virtualProblem = BipartiteMaximalMatching(Graph(True))
+            
+        if state.state1 != None:
+            self.virtualProblem.adoptState(state.state1)
+        if state.state2 != None:
+            self.virtualProblem.adoptState(state.state2)
+        return state
+        
+    # returns (v1, v2): nodes of the virtual network for the node with the given name
+    def virtualNodes(self, name):
+        v = self.virtualIndex.get(name)
+        if v == None:
+            return (None, None)
+        return (2 * v, 2 * v + 1)
+        
+    # The virtual network is the bipartite double cover of the graph: node v of the
+    # graph (by its index) is node 2v (colored 1) and 2v + 1 (colored 2) of the
+    # virtual network, and its port i connects 2v to 2u + 1 and 2v + 1 to 2u through
+    # port j, where port i of v is connected to port j of u.
+    # It is built in a single pass over the ports as a CompactGraph, and reused until
+    # the graph changes. A shard (see parallelEngine) builds only the virtual nodes of
+    # its own nodes and of their neighbours, and runs only its own virtual nodes
     def initializeVirtual(self):
-    
-        # let us construct the virtual network
-        self.virtualNetwork = Graph(True)
-        self.virtualProblem = BipartiteMaximalMatching(self.virtualNetwork)
-    
-        # construct the virtual nodes
-        for node in self.graph.nodes:
-            v1 = self.virtualNetwork.addNode(addName = False, color = 1)
-            v1.name = node.name + '_1'
-            v2 = self.virtualNetwork.addNode(addName = False, color = 2)
-            v2.name = node.name + '_2'
+        graph = self.graph
+        if self.shard == None:
+            (self.virtualNetwork, self.virtualIndex) = graph.cached('doubleCover', lambda: doubleCover(graph))
+        else:
+            (self.virtualNetwork, self.virtualIndex) = doubleCover(graph, self.shard)
             
-        # construct the virtual edges
-        for node in self.graph.nodes:
-            for i in node.portNumbering():
-                (adj, j) = node.getAdjacentByPortNumber(i)
-                
-                u1 = self.virtualNodeByName(node.name, 1)
-                u2 = self.virtualNodeByName(node.name, 2)
-                v1 = self.virtualNodeByName(adj.name, 1)
-                v2 = self.virtualNodeByName(adj.name, 2)
-                
-                if not self.virtualNetwork.hasEdgeWithNodes(u1, v2):
-                    e1 = self.virtualNetwork.addEdge(u1, v2, addPortNumbering = False)
-                    e1.newPortNumberForNode(u1, i)
-                    e1.newPortNumberForNode(v2, j)
-                
-                if not self.virtualNetwork.hasEdgeWithNodes(u2, v1):
-                    e2 = self.virtualNetwork.addEdge(u2, v1, addPortNumbering = False)
-                    e2.newPortNumberForNode(u2, i)
-                    e2.newPortNumberForNode(v1, j)
+        self.virtualProblem = BipartiteMaximalMatching(self.virtualNetwork)
         
+        if self.shard != None:
+            virtualShard = []
+            for node in self.shard:
+                virtualShard.extend(self.virtualNodes(self.graph.nodeName(node)))
+            self.virtualProblem.shard = virtualShard
+            
     def __init__(self, graph):
+    
+        # name -> index of the nodes of the graph, see doubleCover
+        self.virtualIndex = {}
              
         # define the states for the problem
-        self.BothRunning = State('BR', 'v1 running, v2 running')
-        self.V1Running =   State('V1', 'v1 running, v2 stopped')
-        self.V2Running =   State('V2', 'v1 stopped, v2 running')
-        self.BothStopped = State('BS', 'v1 stopped, v2 stopped')
-        self.BothStopped.output = -1
-        
-        for state in self.states():
-            # BipartiteMaximalMatching states of nodes V1 and V2 in the virtual network
-            # To be initialized while running the first round
-            state.state1 = None 
-            state.state2 = None
-            state.params = lambda: self.paramsByState(state)
+        self.BothRunning = CoverState('BR', 'v1 running, v2 running')
+        self.V1Running =   CoverState('V1', 'v1 running, v2 stopped')
+        self.V2Running =   CoverState('V2', 'v1 stopped, v2 running')
+        self.BothStopped = CoverState('BS', 'v1 stopped, v2 stopped')
                 
         DistributedAlgorithm.__init__(self, "Minimum Vertex Cover 3-approximation", graph, True)
-        
\ No newline at end of file
+        
+# names of the nodes of the bipartite double cover: name_1 and name_2 for node name of
+# the graph, generated when accessed. nodes are the nodes of the graph in the order of
+# the double cover
+class VirtualNames:
+    def __init__(self, graph, nodes):
+        self.graph = graph
+        self.nodes = nodes
+        
+    def __len__(self):
+        return 2 * len(self.nodes)
+        
+    def __getitem__(self, v):
+        return self.graph.nodeName(self.nodes[v // 2]) + '_' + str(v % 2 + 1)
+
+# FOR INTERNAL USE ONLY
+# returns (double cover as CompactGraph, dict: node name -> index of the node in the
+# double cover), see MinimumVertexCover3Approximation.initializeVirtual. With a shard,
+# the cover has the shard nodes followed by their neighbours outside of the shard, and
+# only the shard nodes have ports
+def doubleCover(graph, shard = None):
+    if shard == None:
+        nodes = graph.nodes
+        own = len(nodes)
+    else:
+        nodes = dict.fromkeys(shard)
+        own = len(nodes)
+        for node in shard:
+            for i in graph.nodePorts(node):
+                nodes.setdefault(graph.adjacentByPortNumber(node, i)[0])
+        nodes = list(nodes)
+    n = len(nodes)
+    
+    index = None
+    if not isinstance(nodes, range):
+        index = {}
+        for v, node in enumerate(nodes):
+            index[node] = v
+    
+    virtualIndex = {}
+    offsets = array('q', bytes(8 * (2 * n + 1)))
+    for v, node in enumerate(nodes):
+        name = graph.nodeName(node)
+        if name in virtualIndex:
+            raise Exception('node names have to be unique, ' + name + ' is the name of several nodes')
+        virtualIndex[name] = v
+        
+        d = graph.nodeDegree(node) if v < own else 0
+        offsets[2 * v + 1] = offsets[2 * v] + d
+        offsets[2 * v + 2] = offsets[2 * v + 1] + d
+        
+    neighbor = array('i', [-1]) * offsets[2 * n]
+    neighborPort = array('i', [-1]) * offsets[2 * n]
+    for v in range(own):
+        node = nodes[v]
+        slot1 = offsets[2 * v] - 1
+        slot2 = offsets[2 * v + 1] - 1
+        d = offsets[2 * v + 1] - offsets[2 * v]
+        
+        for i in graph.nodePorts(node):
+            if i < 1 or i > d:
+                raise Exception('port numbers of node ' + graph.nodeName(node) + ' are not 1..' + str(d))
+                
+            (adj, j) = graph.adjacentByPortNumber(node, i)
+            u = adj if index == None else index[adj]
+            
+            neighbor[slot1 + i] = 2 * u + 1
+            neighborPort[slot1 + i] = j
+            neighbor[slot2 + i] = 2 * u
+            neighborPort[slot2 + i] = j
+            
+    colors = array('i', [1, 2]) * n
+    return (CompactGraph(offsets, neighbor, neighborPort, colors, VirtualNames(graph, nodes)), virtualIndex)
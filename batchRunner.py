@@ -0,0 +1,160 @@
+
+# Headless batch runner: runs a distributed algorithm on a graph until it halts
+# and prints the result as JSON. Does not import pygame.
+#
+#   python3 -m batchRunner --algorithm matching --graph graph.json
+#   python3 -m batchRunner --algorithm mvc --generate cycle:1000 --max-rounds 500
+#
+# Graph files are JSON: {"nodes": [{"name": "A", "color": 1}, ...], "edges": [["A", "B"], ...]}
+# An edge can also give its port numbers: ["A", "B", 2, 1]. Without them ports are
+# numbered in the order the edges are listed. Files ending with .pngraph are binary graph
+# files, see graphFile.py.
+
+import argparse
+import contextlib
+import json
+import sys
+import time
+
+import graphFile
+from graph import Graph
+from messageCounter import MessageCounter
+from profiler import RoundProfiler
+from traceFile import TraceWriter
+from algorithms import BipartiteMaximalMatching, MinimumVertexCover3Approximation
+
+ALGORITHMS = {
+    'matching': BipartiteMaximalMatching,
+    'mvc': MinimumVertexCover3Approximation,
+}
+
+def loadGraph(path):
+    if path.endswith('.pngraph'):
+        return graphFile.load(path)
+        
+    with open(path) as f:
+        data = json.load(f)
+
+    graph = Graph(True)
+    colors = [item.get('color', 0) for item in data['nodes']]
+    names = [str(item.get('name', index)) for index, item in enumerate(data['nodes'])]
+    graph.addNodes(len(names), colors, names)
+
+    edges = []
+    for item in data['edges']:
+        node1 = graph.nodeByName(str(item[0]))
+        node2 = graph.nodeByName(str(item[1]))
+        if (node1 == None) or (node2 == None):
+            raise Exception('edge ' + str(item) + ' refers to unknown node')
+
+        if len(item) == 4:
+            edges.append((node1, item[2], node2, item[3]))
+        else:
+            edges.append((node1, node2))
+
+    graph.addEdges(edges)
+    return graph
+
+# cycle with alternating colors 1 and 2, the default graph of the playground is cycle:4
+def cycleGraph(n):
+    graph = Graph(True)
+    nodes = graph.addNodes(n, [(i % 2) + 1 for i in range(n)], [str(i) for i in range(n)])
+
+    # two nodes have a single edge and one node none
+    edges = n if n > 2 else n - 1
+    graph.addEdges([(nodes[i], nodes[(i + 1) % n]) for i in range(edges)])
+    return graph
+
+GENERATORS = {
+    'cycle': cycleGraph,
+}
+
+# spec is name:parameter, for example cycle:1000
+def generateGraph(spec):
+    (name, _, parameter) = spec.partition(':')
+    if name not in GENERATORS:
+        raise Exception('unknown generator ' + name + ', choose from ' + ', '.join(GENERATORS))
+
+    return GENERATORS[name](int(parameter))
+
+# runs until the algorithm halts or maxRounds is reached, returns the result as a dict.
+# With progress, the fraction of halted nodes is reported to stderr after every round.
+# With profile, the time spent in the phases of the rounds is added to the result, with
+# countMessages the number of messages and their estimated size in bits. With trace,
+# the rounds are written to the given trace file
+def run(algorithm, maxRounds, progress = False, profile = False, countMessages = False, trace = None):
+    graph = algorithm.graph
+    
+    if profile:
+        profiler = RoundProfiler()
+        profiler.attach(algorithm)
+        
+    if countMessages:
+        counter = MessageCounter()
+        counter.attach(algorithm)
+        
+    if trace != None:
+        tracer = TraceWriter(trace)
+        tracer.attach(algorithm)
+
+    # algorithms report problems by printing, keep stdout clean for the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        algorithm.runOneRound()
+        while algorithm.running and algorithm.counter < maxRounds:
+            if progress:
+                print('round ' + str(algorithm.counter) + ': ' + format(algorithm.fractionHalted(), '.1%') + ' halted')
+            algorithm.runOneRound()
+        seconds = time.perf_counter() - start
+        
+    if trace != None:
+        tracer.detach(algorithm)
+        tracer.close()
+
+    states = algorithm.afterRoundStates
+    result = {
+        'algorithm': str(algorithm),
+        'nodes': len(graph.nodes),
+        'validInput': algorithm.counter > 0,
+        'halted': (algorithm.counter > 0) and not algorithm.running,
+        'rounds': algorithm.counter,
+        'seconds': seconds,
+        'outputs': {graph.nodeName(node): str(states[node]) for node in states},
+    }
+    
+    if profile:
+        profiler.detach(algorithm)
+        result['phaseSeconds'] = profiler.run['totals']
+        
+    if countMessages:
+        counter.detach(algorithm)
+        result['messages'] = counter.totals
+        
+    return result
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'batchRunner', description = 'Run a distributed algorithm without the UI and print the result as JSON.')
+    parser.add_argument('--algorithm', required = True, choices = sorted(ALGORITHMS))
+    source = parser.add_mutually_exclusive_group(required = True)
+    source.add_argument('--graph', help = 'JSON graph file')
+    source.add_argument('--generate', help = 'graph generator, for example cycle:1000')
+    parser.add_argument('--max-rounds', type = int, default = 10000)
+    parser.add_argument('--progress', action = 'store_true', help = 'report the fraction of halted nodes to stderr after every round')
+    parser.add_argument('--profile', action = 'store_true', help = 'add the time spent in the phases of the rounds to the result')
+    parser.add_argument('--count-messages', action = 'store_true', help = 'add the number of messages and their estimated size in bits to the result')
+    parser.add_argument('--trace', help = 'write the state changes and messages of every round to this gzip compressed file')
+    args = parser.parse_args(argv)
+
+    if args.graph != None:
+        graph = loadGraph(args.graph)
+    else:
+        graph = generateGraph(args.generate)
+
+    result = run(ALGORITHMS[args.algorithm](graph), args.max_rounds, args.progress, args.profile, args.count_messages, args.trace)
+    json.dump(result, sys.stdout, indent = 2)
+    print()
+
+    return 0 if result['halted'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
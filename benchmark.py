@@ -0,0 +1,253 @@
+
+# Benchmark suite: runs the algorithms on generated graph families of growing size and
+# maximum degree, and reports for every run the rounds until halting, time to halt,
+# rounds/sec, nodes*rounds/sec and peak memory. The results are written as JSON so that
+# engines and revisions can be compared.
+#
+#   python3 -m benchmark --suite quick --output before.json
+#   python3 -m benchmark --suite quick --output after.json --compare before.json
+#
+# The first round also initializes the algorithm, so it is reported separately and
+# rounds/sec is computed from the remaining rounds. Every timed run is repeated
+# (--repeat) and the fastest one is reported. Peak memory is measured with
+# tracemalloc in a separate run, so that tracing does not slow down the timed run,
+# and does not include the graph itself (nor the worker processes of the parallel engine).
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import generators
+from batchRunner import ALGORITHMS
+
+# sizes for the scaling in the number of nodes (with average degree about 4), and
+# maximum degrees for the scaling in the degree (with degreeNodes nodes)
+SUITES = {
+    'quick': {'sizes': [500, 2000, 8000], 'degrees': [2, 4, 8, 16], 'degreeNodes': 2000},
+    'full': {'sizes': [1000, 4000, 16000, 64000, 256000], 'degrees': [2, 4, 8, 16, 32, 64], 'degreeNodes': 16000},
+}
+
+ENGINES = ['sequential', 'vectorized', 'parallel']
+
+def bipartiteFamily(n, d, seed):
+    return generators.randomBipartite(n // 2, n - n // 2, n * d // 2, seed = seed)
+
+def regularFamily(n, d, seed):
+    return generators.regular(n, d, seed = seed)
+
+# the degree is always 4 in the inside of a grid
+def gridFamily(n, d, seed):
+    side = max(1, int(math.sqrt(n)))
+    return generators.grid(side, side, seed = seed)
+
+def powerLawFamily(n, d, seed):
+    return generators.powerLaw(n, max(1, d // 2), seed = seed)
+
+# name -> (generator(n, d, seed), bipartite)
+FAMILIES = {
+    'bipartite': (bipartiteFamily, True),
+    'regular': (regularFamily, False),
+    'grid': (gridFamily, True),
+    'powerLaw': (powerLawFamily, False),
+}
+
+# FOR INTERNAL USE ONLY
+# list of benchmark cases as dicts, scaling is 'nodes' or 'degree'
+def cases(suite, engines):
+    parameters = SUITES[suite]
+    graphs = []
+    for family in ('bipartite', 'grid', 'powerLaw'):
+        for n in parameters['sizes']:
+            graphs.append(('nodes', family, n, 4))
+    for family in ('bipartite', 'regular'):
+        for d in parameters['degrees']:
+            graphs.append(('degree', family, parameters['degreeNodes'], d))
+
+    result = []
+    for (scaling, family, n, d) in graphs:
+        for algorithm in sorted(ALGORITHMS):
+            if algorithm == 'matching' and not FAMILIES[family][1]:
+                continue
+            for engine in engines:
+                if engine == 'vectorized' and algorithm != 'matching':
+                    continue
+                result.append({'scaling': scaling, 'family': family, 'n': n, 'd': d, 'algorithm': algorithm, 'engine': engine})
+    return result
+
+# FOR INTERNAL USE ONLY
+def createEngine(case, graph, processes):
+    algorithmClass = ALGORITHMS[case['algorithm']]
+    if case['engine'] == 'vectorized':
+        from vectorizedMatching import VectorizedBipartiteMaximalMatching
+        return VectorizedBipartiteMaximalMatching(graph)
+    if case['engine'] == 'parallel':
+        from parallelEngine import ParallelEngine
+        return ParallelEngine(algorithmClass, graph, processes)
+    return algorithmClass(graph)
+
+# FOR INTERNAL USE ONLY
+# runs until halting or maxRounds, returns (rounds, halted, seconds, firstRoundSeconds)
+def runEngine(engine, maxRounds):
+    start = time.perf_counter()
+    engine.runOneRound()
+    firstRound = time.perf_counter()
+    while engine.running and engine.counter < maxRounds:
+        engine.runOneRound()
+    end = time.perf_counter()
+
+    if hasattr(engine, 'close'):
+        engine.close()
+
+    halted = (engine.counter > 0) and not engine.running
+    return (engine.counter, halted, end - start, firstRound - start)
+
+# the timed run is repeated and the fastest one is reported
+def runCase(case, maxRounds, processes, memory, seed, repeat = 1):
+    start = time.perf_counter()
+    graph = FAMILIES[case['family']][0](case['n'], case['d'], seed)
+    buildSeconds = time.perf_counter() - start
+
+    n = graph.numberOfNodes()
+    runs = [runEngine(createEngine(case, graph, processes), maxRounds) for k in range(max(1, repeat))]
+    (rounds, halted, seconds, firstRoundSeconds) = min(runs, key = lambda result: result[2])
+
+    row = dict(case)
+    row.update({
+        'nodes': n,
+        'edges': graph.numberOfEdges(),
+        'maxDegree': max([graph.nodeDegree(v) for v in graph.nodes], default = 0),
+        'buildSeconds': buildSeconds,
+        'rounds': rounds,
+        'halted': halted,
+        'seconds': seconds,
+        'firstRoundSeconds': firstRoundSeconds,
+        'roundsPerSecond': None,
+        'nodeRoundsPerSecond': None,
+        'peakBytes': None,
+    })
+
+    if rounds > 1 and seconds > firstRoundSeconds:
+        row['roundsPerSecond'] = (rounds - 1) / (seconds - firstRoundSeconds)
+        row['nodeRoundsPerSecond'] = row['roundsPerSecond'] * n
+
+    if memory:
+        tracemalloc.start()
+        runEngine(createEngine(case, graph, processes), maxRounds)
+        row['peakBytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return row
+
+# FOR INTERNAL USE ONLY
+def caseKey(row):
+    return (row['scaling'], row['family'], row['n'], row['d'], row['algorithm'], row['engine'])
+
+# FOR INTERNAL USE ONLY
+# exponent k of the fit seconds ~ x^k by least squares on the log-log scale
+def scalingExponent(points):
+    points = [(math.log(x), math.log(y)) for (x, y) in points if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+
+    meanX = sum(x for (x, y) in points) / len(points)
+    meanY = sum(y for (x, y) in points) / len(points)
+    variance = sum((x - meanX) ** 2 for (x, y) in points)
+    if variance == 0:
+        return None
+    return sum((x - meanX) * (y - meanY) for (x, y) in points) / variance
+
+# prints one scaling curve per family, algorithm and engine: time to halt against the
+# number of nodes or the maximum degree
+def printScaling(rows, out):
+    curves = {}
+    for row in rows:
+        key = (row['scaling'], row['family'], row['algorithm'], row['engine'])
+        curves.setdefault(key, []).append(row)
+
+    for ((scaling, family, algorithm, engine), curve) in sorted(curves.items()):
+        x = 'nodes' if scaling == 'nodes' else 'maxDegree'
+        points = [(row[x], row['seconds']) for row in curve]
+        exponent = scalingExponent(points)
+
+        print(family + ' ' + algorithm + ' ' + engine + ', time to halt against ' + x + ':', file = out)
+        for row in curve:
+            rate = row['nodeRoundsPerSecond']
+            rate = '-' if rate == None else format(rate, '.3g')
+            memory = '-' if row['peakBytes'] == None else format(row['peakBytes'] / 2 ** 20, '.1f') + ' MiB'
+            print('  ' + x + ' ' + str(row[x]).rjust(7) + '  rounds ' + str(row['rounds']).rjust(5) + '  ' + format(row['seconds'], '.3f').rjust(9) + ' s  ' + rate.rjust(9) + ' node-rounds/s  ' + memory, file = out)
+        if exponent != None:
+            print('  scaling exponent ' + format(exponent, '.2f'), file = out)
+
+# prints the ratio of time to halt and peak memory against the same cases of an earlier result file
+def printComparison(rows, path, out):
+    with open(path) as f:
+        baseline = {caseKey(row): row for row in json.load(f)['results']}
+
+    print('compared to ' + path + ' (ratio > 1 is slower or larger):', file = out)
+    for row in rows:
+        old = baseline.get(caseKey(row))
+        if old == None:
+            continue
+
+        line = '  ' + ' '.join(str(a) for a in caseKey(row)) + ': time ' + format(row['seconds'] / old['seconds'], '.2f')
+        if row['peakBytes'] != None and old['peakBytes']:
+            line += ', memory ' + format(row['peakBytes'] / old['peakBytes'], '.2f')
+        if row['rounds'] != old['rounds']:
+            line += ', rounds changed from ' + str(old['rounds']) + ' to ' + str(row['rounds'])
+        print(line, file = out)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'benchmark', description = 'Benchmark the distributed algorithms on generated graphs and report the scaling.')
+    parser.add_argument('--suite', choices = sorted(SUITES), default = 'quick')
+    parser.add_argument('--engines', nargs = '+', choices = ENGINES, default = ['sequential', 'vectorized'])
+    parser.add_argument('--algorithms', nargs = '+', choices = sorted(ALGORITHMS), default = sorted(ALGORITHMS))
+    parser.add_argument('--processes', type = int, default = None, help = 'worker processes of the parallel engine')
+    parser.add_argument('--max-rounds', type = int, default = 10000)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--repeat', type = int, default = 3, help = 'timed runs per case, the fastest one is reported')
+    parser.add_argument('--no-memory', action = 'store_true', help = 'skip the peak memory measurement')
+    parser.add_argument('--output', help = 'write the results to this JSON file')
+    parser.add_argument('--compare', help = 'JSON result file of an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    engines = list(args.engines)
+    if 'vectorized' in engines:
+        try:
+            import numpy
+        except ImportError:
+            print('numpy is not installed, skipping the vectorized engine', file = sys.stderr)
+            engines.remove('vectorized')
+
+    rows = []
+    for case in cases(args.suite, engines):
+        if case['algorithm'] not in args.algorithms:
+            continue
+        print(' '.join(str(a) for a in caseKey(case)), file = sys.stderr)
+        rows.append(runCase(case, args.max_rounds, args.processes, not args.no_memory, args.seed, args.repeat))
+
+    result = {
+        'suite': args.suite,
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'results': rows,
+    }
+
+    if args.output != None:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent = 2)
+
+    printScaling(rows, sys.stdout)
+    if args.compare != None:
+        printComparison(rows, args.compare, sys.stdout)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
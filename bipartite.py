@@ -0,0 +1,69 @@
+
+from collections import deque
+
+# Bipartiteness of a graph.Graph or compactGraph.CompactGraph by breadth-first search,
+# in O(V + E) time.
+#
+#   (coloring, oddCycle) = twoColoring(graph)
+#
+# coloring[node] is 1 or 2 so that adjacent nodes have different colors, and the nodes
+# found first in every connected component get color 1. If the graph is not bipartite,
+# coloring is None and oddCycle is the list of nodes of a cycle of odd length as
+# evidence, every node is adjacent to the next one and the last one to the first one.
+def twoColoring(graph):
+    (color, parent) = nodeTables(graph)
+
+    for root in graph.nodes:
+        if color[root] != 0:
+            continue
+
+        color[root] = 1
+        queue = deque([root])
+        while len(queue) > 0:
+            node = queue.popleft()
+            for port in graph.nodePorts(node):
+                (adj, j) = graph.adjacentByPortNumber(node, port)
+                if color[adj] == 0:
+                    color[adj] = 3 - color[node]
+                    parent[adj] = node
+                    queue.append(adj)
+                elif color[adj] == color[node]:
+                    return (None, oddCycle(parent, node, adj))
+
+    return (color, None)
+
+# returns (node, adjacent node) with the same color in the graph, or None if the colors
+# of all adjacent nodes differ
+def sameColorEdge(graph):
+    for node in graph.nodes:
+        color = graph.nodeColor(node)
+        for port in graph.nodePorts(node):
+            (adj, j) = graph.adjacentByPortNumber(node, port)
+            if graph.nodeColor(adj) == color:
+                return (node, adj)
+
+    return None
+
+# FOR INTERNAL USE ONLY
+# (color, parent) indexable by the nodes of the graph, lists for the integer nodes of a
+# CompactGraph
+def nodeTables(graph):
+    nodes = graph.nodes
+    if isinstance(nodes, range):
+        return ([0] * len(nodes), [None] * len(nodes))
+    return (dict.fromkeys(nodes, 0), dict.fromkeys(nodes))
+
+# FOR INTERNAL USE ONLY
+# adjacent nodes u and w have the same color, so they are at the same depth of the
+# search tree. The tree paths from u and w up to their closest common ancestor and
+# the edge between u and w form a cycle of odd length
+def oddCycle(parent, u, w):
+    left = [u]
+    right = [w]
+    while u != w:
+        u = parent[u]
+        w = parent[w]
+        left.append(u)
+        right.append(w)
+
+    return left + right[-2::-1]
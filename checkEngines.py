@@ -0,0 +1,108 @@
+
+# Equivalence check of the alternative engines against the sequential engine: runs
+# parallelEngine.ParallelEngine (with one and with several worker processes) and
+# vectorizedMatching.VectorizedBipartiteMaximalMatching side by side with the
+# sequential runOneRound on random graphs and compares the states after every round.
+#
+#   python3 -m checkEngines
+#   python3 -m checkEngines --graphs 100 --max-nodes 200 --processes 1 2 5
+#
+# Prints the first difference and exits with 1 if the engines disagree.
+
+import argparse
+import random
+import sys
+
+import generators
+from algorithms import BipartiteMaximalMatching, MinimumVertexCover3Approximation
+from parallelEngine import ParallelEngine
+
+# FOR INTERNAL USE ONLY
+# random bipartite graph for the matching, random general graph for the vertex cover
+def randomGraph(algorithmClass, maxNodes, rnd):
+    seed = rnd.randrange(2 ** 32)
+    if algorithmClass == BipartiteMaximalMatching:
+        n1 = rnd.randint(1, maxNodes // 2)
+        n2 = rnd.randint(1, maxNodes // 2)
+        m = rnd.randint(0, min(n1 * n2, 3 * (n1 + n2)))
+        return generators.randomBipartite(n1, n2, m, seed = seed)
+
+    n = rnd.randint(2, maxNodes)
+    return generators.erdosRenyi(n, rnd.uniform(0, 4 / n), seed = seed)
+
+# FOR INTERNAL USE ONLY
+# runs the reference and the other engine in lockstep, states is a function returning
+# the states of the other engine after the latest round. Returns None if the runs agree,
+# otherwise a description of the first difference
+def compare(reference, other, states):
+    reference.runOneRound()
+    other.runOneRound()
+
+    while True:
+        expected = {node: str(state) for (node, state) in reference.afterRoundStates.items()}
+        actual = {node: str(state) for (node, state) in states().items()}
+
+        for node in expected:
+            if expected[node] != actual.get(node):
+                return 'round ' + str(reference.counter) + ', node ' + str(node) + ': expected ' + expected[node] + ', got ' + str(actual.get(node))
+        if len(actual) != len(expected):
+            return 'round ' + str(reference.counter) + ': expected ' + str(len(expected)) + ' states, got ' + str(len(actual))
+        if reference.running != other.running:
+            return 'round ' + str(reference.counter) + ': expected running ' + str(reference.running) + ', got ' + str(other.running)
+
+        if not reference.running:
+            return None
+
+        reference.runOneRound()
+        other.runOneRound()
+
+def checkParallel(algorithmClass, graph, processes):
+    with ParallelEngine(algorithmClass, graph, processes) as engine:
+        return compare(algorithmClass(graph), engine, engine.collectStates)
+
+def checkVectorized(graph):
+    from vectorizedMatching import VectorizedBipartiteMaximalMatching
+
+    engine = VectorizedBipartiteMaximalMatching(graph)
+    return compare(BipartiteMaximalMatching(graph), engine, engine.currentStates)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'checkEngines', description = 'Compare the parallel and vectorized engines against the sequential engine round by round.')
+    parser.add_argument('--graphs', type = int, default = 20, help = 'number of random graphs per algorithm')
+    parser.add_argument('--max-nodes', type = int, default = 60)
+    parser.add_argument('--processes', type = int, nargs = '+', default = [1, 3], help = 'worker counts of the parallel engine')
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    rnd = random.Random(args.seed)
+    maxNodes = max(2, args.max_nodes)
+
+    try:
+        import numpy
+        vectorized = True
+    except ImportError:
+        print('numpy is not installed, skipping the vectorized engine')
+        vectorized = False
+
+    failures = 0
+    for algorithmClass in (BipartiteMaximalMatching, MinimumVertexCover3Approximation):
+        for index in range(args.graphs):
+            graph = randomGraph(algorithmClass, maxNodes, rnd)
+
+            checks = [('parallel, ' + str(processes) + ' processes', checkParallel, (algorithmClass, graph, processes)) for processes in args.processes]
+            if vectorized and algorithmClass == BipartiteMaximalMatching:
+                checks.append(('vectorized', checkVectorized, (graph,)))
+
+            for (name, check, checkArgs) in checks:
+                difference = check(*checkArgs)
+                if difference != None:
+                    failures += 1
+                    print(algorithmClass.__name__ + ', graph ' + str(index) + ' (' + str(graph.numberOfNodes()) + ' nodes), ' + name + ': ' + difference)
+
+    if failures == 0:
+        print('all engines agree with the sequential engine')
+        return 0
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
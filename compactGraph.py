@@ -0,0 +1,133 @@
+
+from array import array
+
+from graph import Graph
+
+# Array-backed port-numbered graph in compressed sparse row (CSR) form.
+# Nodes are plain integers 0..n-1 and there are no per-node or per-edge objects:
+# port i of node v (1 <= i <= deg(v)) is stored at slot offsets[v] + i - 1 of the
+# neighbor and neighborPort arrays.
+class CompactGraph:
+    def __init__(self, offsets, neighbor, neighborPort, colors, names = None):
+        self.offsets = offsets
+        self.neighbor = neighbor
+        self.neighborPort = neighborPort
+        self.colors = colors
+
+        # names are optional, nodes without names are named by their index
+        self.names = names
+        self.virtual = True
+        
+        # compact graphs do not change, see graph.Graph.version
+        self.version = 0
+        self.derived = {}
+        self.derivedVersion = 0
+
+    # edges is an iterable of (node1, port1, node2, port2), node indices starting from 0.
+    # Port numbers of every node have to be exactly 1..deg
+    @classmethod
+    def fromPortEdges(cls, numberOfNodes, edges, colors = None, names = None):
+        edges = list(edges)
+
+        degrees = array('q', bytes(8 * numberOfNodes))
+        for (u, i, v, j) in edges:
+            degrees[u] += 1
+            degrees[v] += 1
+
+        offsets = array('q', bytes(8 * (numberOfNodes + 1)))
+        for v in range(numberOfNodes):
+            offsets[v + 1] = offsets[v] + degrees[v]
+
+        neighbor = array('i', [-1]) * offsets[numberOfNodes]
+        neighborPort = array('i', [-1]) * offsets[numberOfNodes]
+
+        def place(u, i, v, j):
+            if i < 1 or i > degrees[u]:
+                raise Exception('port number ' + str(i) + ' out of range for node ' + str(u))
+
+            slot = offsets[u] + i - 1
+            if neighbor[slot] != -1:
+                raise Exception('duplicate port number ' + str(i) + ' for node ' + str(u))
+
+            neighbor[slot] = v
+            neighborPort[slot] = j
+
+        for (u, i, v, j) in edges:
+            place(u, i, v, j)
+            place(v, j, u, i)
+
+        if colors == None:
+            colors = array('i', bytes(4 * numberOfNodes))
+        else:
+            colors = array('i', colors)
+
+        return cls(offsets, neighbor, neighborPort, colors, names)
+
+    @classmethod
+    def fromGraph(cls, graph):
+        index = {}
+        for v, node in enumerate(graph.nodes):
+            index[node] = v
+
+        edges = []
+        for edge in graph.edges:
+            (node1, port1) = edge.node0WithPort()
+            (node2, port2) = edge.node1WithPort()
+            edges.append((index[node1], port1, index[node2], port2))
+
+        colors = [node.color for node in graph.nodes]
+        names = [node.name for node in graph.nodes]
+        return cls.fromPortEdges(len(graph.nodes), edges, colors, names)
+
+    # the result is a virtual graph, since node positions are not stored
+    def toGraph(self):
+        graph = Graph(True)
+        nodes = graph.addNodes(self.numberOfNodes(), list(self.colors), [self.nodeName(v) for v in self.nodes])
+
+        edges = []
+        for v in self.nodes:
+            for i in self.nodePorts(v):
+                (u, j) = self.adjacentByPortNumber(v, i)
+                if v < u:
+                    edges.append((nodes[v], i, nodes[u], j))
+
+        graph.addEdges(edges)
+        return graph
+
+    def numberOfNodes(self):
+        return len(self.offsets) - 1
+
+    def numberOfEdges(self):
+        return len(self.neighbor) // 2
+
+    @property
+    def nodes(self):
+        return range(self.numberOfNodes())
+
+    def colorsInGraph(self):
+        return self.cached('colorsInGraph', lambda: set(self.colors))
+        
+    # same derived data cache as graph.Graph, which is not pickled either
+    cached = Graph.cached
+    __getstate__ = Graph.__getstate__
+
+    # graph interface shared with graph.Graph, used by the distributed algorithms
+
+    def nodeName(self, v):
+        if self.names == None:
+            return str(v)
+        return self.names[v]
+
+    def nodeColor(self, v):
+        return self.colors[v]
+
+    def nodeDegree(self, v):
+        return self.offsets[v + 1] - self.offsets[v]
+
+    def nodePorts(self, v):
+        return range(1, self.offsets[v + 1] - self.offsets[v] + 1)
+
+    # returns tuple (node, port)
+    def adjacentByPortNumber(self, v, port):
+        slot = self.offsets[v] + port - 1
+        return (self.neighbor[slot], self.neighborPort[slot])
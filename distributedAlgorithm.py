@@ -1,5 +1,4 @@
 
-import copy
 import math
 from abc import ABC, abstractmethod
 
@@ -9,16 +8,59 @@ ALLPORTS = 100100
 # a special flag used in simulation to show as empty message
 SIM_EMPTY_MESSAGE = -1
 
-# abstract base class for states. Caller will initialize internal variables
+# interned state ids: states with the same name and description share the id, so
+# algorithms reusing a state name with another meaning get their own id
+stateIds = {}
+stateNames = []
+stateDescs = []
+
+def internState(name, desc):
+    key = (name, desc)
+    if key not in stateIds:
+        stateIds[key] = len(stateNames)
+        stateNames.append(name)
+        stateDescs.append(desc)
+    return stateIds[key]
+    
+# slots of a State class including its base classes, cached per class
+stateSlots = {}
+
+def allSlots(cls):
+    if cls not in stateSlots:
+        slots = []
+        for base in reversed(cls.__mro__):
+            slots.extend(base.__dict__.get('__slots__', ()))
+        stateSlots[cls] = tuple(slots)
+    return stateSlots[cls]
+
+# base class for states. Algorithms subclass this and declare their internal
+# variables as __slots__, initializing them in __init__
 class State:
+    __slots__ = ('id', 'alg')
+
     def __init__(self, name, desc):
-        self.name = name
-        self.desc = desc
-        self.params = lambda: []
+        self.id = internState(name, desc)
+        
+        # the algorithm which owns the state, set by copy
+        self.alg = None
+        
+    @property
+    def name(self):
+        return stateNames[self.id]
+        
+    @property
+    def desc(self):
+        return stateDescs[self.id]
     
     def __str__(self):
         return self.toString()
         
+    # internal variables are only queried from the algorithm when the state is shown
+    def params(self):
+        if self.alg == None:
+            return []
+        return self.alg.paramsByState(self)
+        
     def toString(self):
         strpar = self.params()
         strparlen = len(strpar)
@@ -36,13 +78,31 @@ class State:
             output += str(strpar[strparlen - 1]) + ")"
             return output
             
+    # the owning algorithm is not pickled and the id is pickled by name, since interned
+    # ids depend on the order the states were created in the process. The receiving
+    # process attaches the state to its algorithm with DistributedAlgorithm.adoptState
+    def __getstate__(self):
+        state = {}
+        for slot in allSlots(self.__class__):
+            state[slot] = getattr(self, slot)
+        state['id'] = (self.name, self.desc)
+        state['alg'] = None
+        return state
+        
+    def __setstate__(self, state):
+        for slot in state:
+            setattr(self, slot, state[slot])
+        self.id = internState(*state['id'])
+            
     def copy(self, alg):
-        copiedState = copy.copy(self)
-        copiedState.params = lambda: alg.paramsByState(copiedState)
+        copiedState = object.__new__(self.__class__)
+        for slot in allSlots(self.__class__):
+            setattr(copiedState, slot, getattr(self, slot))
+        copiedState.alg = alg
         return copiedState
         
     def equalTo(self, otherState):
-        return self.name == otherState.name
+        return self.id == otherState.id
     
 def copyStates(algorithm, states):
     newStates = {}
@@ -51,26 +111,78 @@ def copyStates(algorithm, states):
         newStates[node] = states[node].copy(algorithm)  
     return newStates
     
-def stateInStoppingStates(state, stoppingStates):
-    for stopState in stoppingStates:
-        if state.equalTo(stopState):
-            return True
-    return False
-    
 #############################################
 
-def addOrAppend(dic, key, value):
-    if key in dic.keys():
-        if value in dic[key]:
+# message slots of a single node: one slot per port, preallocated from the degree.
+# Slots are stamped with the round they were written in, so all slots of the network
+# are emptied at once by moving to the next round
+class MessageSlots:
+    __slots__ = ('messages', 'stamps', 'ports', 'round')
+    
+    def __init__(self, numberOfPorts):
+        self.messages = [None] * (numberOfPorts + 1)
+        self.stamps = [0] * (numberOfPorts + 1)
+        
+        # ports written in the current round, in the order of writing
+        self.ports = []
+        self.round = 0
+        
+    def put(self, round, port, msg):
+        if self.round != round:
+            self.round = round
+            self.ports = []
+        elif self.stamps[port] == round:
+            raise Exception('duplicate port number for messages detected')
+            
+        self.stamps[port] = round
+        self.messages[port] = msg
+        self.ports.append(port)
+        
+    def written(self, round):
+        return self.round == round
+        
+    # returns list[(msg, port)] written in the given round ordered by port, so that the
+    # order does not depend on the order the senders were processed in
+    def received(self, round):
+        if self.round != round:
+            return []
+        return [(self.messages[port], port) for port in sorted(self.ports)]
+        
+# outbox of a single node. A message to all ports is kept as a single broadcast record,
+# single port messages written in the same round override it on their port. The broadcast
+# is expanded to the inbox slots of the receivers when the messages are routed
+class OutboxSlots(MessageSlots):
+    __slots__ = ('broadcast', 'broadcastRound')
+    
+    def __init__(self, numberOfPorts):
+        MessageSlots.__init__(self, numberOfPorts)
+        self.broadcast = None
+        self.broadcastRound = 0
+        
+    def putBroadcast(self, round, msg):
+        if self.broadcastRound == round:
             raise Exception('duplicate port number for messages detected')
             
-        dic[key].append( value )
-    else:
-        dic[key] = [ value ]
+        self.broadcastRound = round
+        self.broadcast = msg
+        
+    def written(self, round):
+        return (self.round == round) or (self.broadcastRound == round)
 
 # abstract base class for distributed algorithms
 class DistributedAlgorithm(ABC):
 
+    # When double buffered, beforeRoundStates and afterRoundStates are swapped between
+    # rounds instead of copying every state. This requires that receive returns a new
+    # state object and never modifies the state it was given. Algorithms which do modify
+    # the given state in place can set this to False.
+    doubleBuffered = True
+    
+    # With active scheduling only the active nodes send and receive each round: nodes which
+    # are running or just stopped, and nodes with incoming messages. Requires that nodes
+    # in stopping states do not send messages.
+    activeScheduling = True
+
     # input is the set of local inputs
     @abstractmethod
     def input(self):
@@ -82,6 +194,11 @@ class DistributedAlgorithm(ABC):
     def validateInput(self):
         pass
         
+    # local input of the node for init, the color of the node unless the algorithm
+    # derives its input in validateInput
+    def nodeInput(self, node):
+        return self.graph.nodeColor(node)
+        
     # states is the set of states
     @abstractmethod
     def states(self):
@@ -118,39 +235,49 @@ class DistributedAlgorithm(ABC):
     def paramsByState(self, state):
         pass
         
-    def virtualNodeByName(self, name, number):
-        if not self.virtual:
-            raise Exception('Can not query for simulation nodes without simulation!')
-            
-        return self.virtualNetwork.nodeByName(name + '_' + str(number))
-      
     # FOR INTERNAL USE ONLY
     def beforeRun(self):
-        if self.allNodesInStoppingState(self.beforeRoundStates):
+        if self.allNodesStopped(self.stoppedBeforeRound):
             print('Running tried even though all nodes are in stopped states!')
             return False
+            
+        return self.startRound()
         
+    # FOR INTERNAL USE ONLY
+    # initializes the states on the first round, otherwise moves the states of the previous round to beforeRoundStates
+    def startRound(self):
         if not self.running:
             if not self.initializeInternalState():
                 return False
             else:
                 self.running = True
+        elif self.doubleBuffered:
+            (self.beforeRoundStates, self.afterRoundStates) = (self.afterRoundStates, self.beforeRoundStates)
         else:
             self.beforeRoundStates = copyStates(self, self.afterRoundStates)
             
+        self.stoppedBeforeRound = self.stoppedCount
         return True
       
     # normal running mode (without simulation)
     def runOneRound(self):         
+        if self.profiler != None:
+            self.profiler.startRound()
           
         if not self.beforeRun():
             return
+            
+        self.markPhase('initialize' if self.counter == 0 else 'swap')
              
         self.sendAndReceiveMessages()
         self.counter += 1
         
-        if self.allNodesInStoppingState(self.afterRoundStates):
+        if self.allNodesStopped(self.stoppedCount):
             self.running = False
+            
+        if self.profiler != None:
+            self.profiler.mark('halt')
+            self.profiler.endRound(self)
               
     # simulation running mode
     def runOneRoundSimulated(self):
@@ -159,36 +286,114 @@ class DistributedAlgorithm(ABC):
             print('Virtual network- and problem required to run simulations!')
             return
             
+        if self.profiler != None:
+            self.profiler.startRound()
+            
         if not self.beforeRun() or not self.virtualProblem.beforeRun():
             return
+            
+        self.markPhase('initialize' if self.counter == 0 else 'swap')
                 
         self.sendAndReceiveMessages()
         
         self.counter += 1
         self.virtualProblem.counter += 1
         
-        if self.allNodesInStoppingState(self.afterRoundStates):
+        if self.allNodesStopped(self.stoppedCount):
             self.running = False 
             
-        if self.virtualProblem.allNodesInStoppingState(self.virtualProblem.afterRoundStates):
+        if self.virtualProblem.allNodesStopped(self.virtualProblem.stoppedCount):
             self.virtualProblem.running = False 
+            
+        if self.profiler != None:
+            self.profiler.mark('halt')
+            self.profiler.endRound(self)
+            
+    # FOR INTERNAL USE ONLY
+    # ends the given phase of the round when profiling, see profiler.py
+    def markPhase(self, phase):
+        if self.profiler != None:
+            self.profiler.mark(phase)
 
     # FOR INTERNAL USE ONLY
     def sendAndReceiveMessages(self):
     
-        # send messages
-        messages = self.mapOutgoingToIncoming(self.constructOutgoingMessages())
-                
-        # receive messages and change state
-        for node in self.graph.nodes:
-            if node in messages.keys():
-                V = messages[node]
-            else:
-                V = []
+        # empties all message slots
+        self.messageRound += 1
+        
+        if not self.activeScheduling:
+            outgoing = self.constructOutgoingMessages(self.ownNodes())
+            self.markPhase('construct')
+            self.mapOutgoingToIncoming(outgoing)
+            self.markPhase('route')
+            self.recordMessages(outgoing)
+            
+            for node in self.ownNodes():
+                V = self.inbox[node].received(self.messageRound)
+                self.setNewStateBasedOnMessages(node, V)
+            self.markPhase('receive')
+            self.traceRound(self.ownNodes())
+            return
+    
+        self.receiveMessages(self.sendMessages())
+        
+    # FOR INTERNAL USE ONLY
+    # sends the messages of the active nodes, returns list of receiving nodes
+    def sendMessages(self):
+        outgoing = self.constructOutgoingMessages(self.active)
+        self.markPhase('construct')
+        receivers = self.mapOutgoingToIncoming(outgoing)
+        self.markPhase('route')
+        self.recordMessages(outgoing)
+        return receivers
+        
+    # FOR INTERNAL USE ONLY
+    # counts and traces the messages of the round when a counter or a tracer is set,
+    # see messageCounter.py and traceFile.py
+    def recordMessages(self, outgoing):
+        if self.messageCounter != None:
+            self.messageCounter.count(self, outgoing)
+            self.markPhase('count')
+            
+        if self.tracer != None:
+            self.tracer.sent(self, outgoing)
+            self.markPhase('trace')
+            
+    # FOR INTERNAL USE ONLY
+    # writes the round to the trace when tracing, nodes ran receive in the round, see traceFile.py
+    def traceRound(self, nodes):
+        if self.tracer != None:
+            self.tracer.received(self, nodes)
+            self.markPhase('trace')
+        
+    # FOR INTERNAL USE ONLY
+    # runs receive for the active nodes and the given receivers of messages
+    def receiveMessages(self, receivers):
+        frontier = self.active
+        for node in receivers:
+            frontier.setdefault(node)
                 
+        # receive messages and change state. A node stays active until it has been in
+        # a stopping state in both state buffers
+        self.active = {}
+        for node in frontier:
+            V = self.inbox[node].received(self.messageRound)
             self.setNewStateBasedOnMessages(node, V)
             
+            if not (self.inStoppingState(self.afterRoundStates[node]) and self.inStoppingState(self.beforeRoundStates[node])):
+                self.active[node] = None
+                
+        self.markPhase('receive')
+        self.traceRound(frontier)
+            
          
+    # FOR INTERNAL USE ONLY
+    # nodes which this instance runs, all nodes of the graph unless a shard is given
+    def ownNodes(self):
+        if self.shard == None:
+            return self.graph.nodes
+        return self.shard
+        
     # FOR INTERNAL USE ONLY
     def initializeInternalState(self):
         if not self.validateInput():
@@ -198,34 +403,78 @@ class DistributedAlgorithm(ABC):
         if self.virtual:
             self.initializeVirtual()
             
-        for node in self.graph.nodes:
-            self.beforeRoundStates[node] = self.init(node.name, node.color, node.degree())
+        self.buildRoutingTable()
+        self.active = dict.fromkeys(self.ownNodes())
+        self.stoppingIds = set(map(lambda a: a.id, self.output()))
+        self.stoppedCount = 0
+            
+        for node in self.ownNodes():
+            state = self.init(self.graph.nodeName(node), self.nodeInput(node), self.graph.nodeDegree(node))
+            self.beforeRoundStates[node] = state
+            
+            if self.inStoppingState(state):
+                self.stoppedCount += 1
             
         return True
             
     # FOR INTERNAL USE ONLY
-    # dict: sending node -> list[(msg, port)]
-    def constructOutgoingMessages(self):
+    # routing table: node -> dict(port -> (adjacent node, adjacent port)), built once per run
+    # since the graph can not change while running, and reused by the next runs on the
+    # same graph until it changes. Message slots are allocated here too, with a shard also
+    # inbox slots for the adjacent nodes outside of the shard
+    def buildRoutingTable(self):
+        if self.shard == None:
+            self.routes = self.graph.cached('routes', self.routesOf)
+        else:
+            self.routes = self.routesOf()
+            
+        self.outbox = {}
+        self.inbox = {}
+        for (node, ports) in self.routes.items():
+            numberOfPorts = max(ports.keys(), default = 0)
+            self.outbox[node] = OutboxSlots(numberOfPorts)
+            self.inbox[node] = MessageSlots(numberOfPorts)
+            
+        if self.shard != None:
+            for ports in list(self.routes.values()):
+                for (adj, j) in ports.values():
+                    if adj not in self.inbox:
+                        self.inbox[adj] = MessageSlots(max(self.graph.nodePorts(adj), default = 0))
+            
+    # FOR INTERNAL USE ONLY
+    def routesOf(self):
+        routes = {}
+        for node in self.ownNodes():
+            ports = {}
+            for port in self.graph.nodePorts(node):
+                ports[port] = self.graph.adjacentByPortNumber(node, port)
+            routes[node] = ports
+        return routes
+            
+    # FOR INTERNAL USE ONLY
+    # writes the messages of the given nodes to the outbox slots, returns list of sending nodes
+    def constructOutgoingMessages(self, nodes):
+        round = self.messageRound
     
         # A little helper functions to reduce the boilerplate below
-        def addForAllPorts(messages, node, message, doubleMessage = None, doubleMessagePort = None):
-            for edge in node.edges():
-                port = edge.portNumberForNode(node)
-                
-                if port == doubleMessagePort:
-                    addOrAppend(messages, node, (doubleMessage, port ) )
-                else:
-                    addOrAppend(messages, node, (message, port ) )
+        def addMessage(node, value):
+            self.outbox[node].put(round, value[1], value[0])
+    
+        def addForAllPorts(node, message, doubleMessage = None, doubleMessagePort = None):
+            slots = self.outbox[node]
+            slots.putBroadcast(round, message)
+            if doubleMessagePort in self.routes[node]:
+                slots.put(round, doubleMessagePort, doubleMessage)
                     
-        def constructMessagesForSingleNode(messages, node, port, msg):
+        def constructMessagesForSingleNode(node, port, msg):
             if port == ALLPORTS:
-                addForAllPorts(messages, node, msg)   
+                addForAllPorts(node, msg)   
             else:
-                addOrAppend(messages, node, (msg, port) )
+                addMessage(node, (msg, port) )
     
-        messages = {}
-        for node in self.graph.nodes:
-            msg = self.send(node.name, self.beforeRoundStates[node], node.degree()) 
+        senders = []
+        for node in nodes:
+            msg = self.send(self.graph.nodeName(node), self.beforeRoundStates[node], self.graph.nodeDegree(node))
             
             # Both V1 or V2 can send one message or message to all ports or no message at all
             # this adds complexity to this part of the code
@@ -241,56 +490,99 @@ class DistributedAlgorithm(ABC):
                     msg2 = msg[1][0]
                     
                     if port1 == ALLPORTS and port2 == ALLPORTS:
-                        addForAllPorts(messages, node, (msg1, msg2)) 
+                        addForAllPorts(node, (msg1, msg2)) 
                     elif port1 == ALLPORTS:
-                        addForAllPorts(messages, node, (msg1, SIM_EMPTY_MESSAGE), (msg1, msg2), port2)          
+                        addForAllPorts(node, (msg1, SIM_EMPTY_MESSAGE), (msg1, msg2), port2)          
                     elif port2 == ALLPORTS:
-                        addForAllPorts(messages, node, (SIM_EMPTY_MESSAGE, msg2), (msg1, msg2), port1)  
+                        addForAllPorts(node, (SIM_EMPTY_MESSAGE, msg2), (msg1, msg2), port1)  
                     else:
                         if port1 == port2:
-                            addOrAppend(messages, node, ((msg1, msg2), port1 ) )
+                            addMessage(node, ((msg1, msg2), port1 ) )
                         else:
-                            addOrAppend(messages, node, ((msg1, SIM_EMPTY_MESSAGE), port1 ) )
-                            addOrAppend(messages, node, ((SIM_EMPTY_MESSAGE, msg2), port2 ) )
+                            addMessage(node, ((msg1, SIM_EMPTY_MESSAGE), port1 ) )
+                            addMessage(node, ((SIM_EMPTY_MESSAGE, msg2), port2 ) )
 
                 elif v1_sends:
-                    constructMessagesForSingleNode(messages, node, msg[0][1], (msg[0][0], SIM_EMPTY_MESSAGE))
+                    constructMessagesForSingleNode(node, msg[0][1], (msg[0][0], SIM_EMPTY_MESSAGE))
                         
                 elif v2_sends:
-                    constructMessagesForSingleNode(messages, node, msg[1][1], (SIM_EMPTY_MESSAGE, msg[1][0]))
+                    constructMessagesForSingleNode(node, msg[1][1], (SIM_EMPTY_MESSAGE, msg[1][0]))
                     
             else:
                 if msg != ():
-                    constructMessagesForSingleNode(messages, node, msg[1], msg[0])
+                    constructMessagesForSingleNode(node, msg[1], msg[0])
                     
-        return messages
+            if self.outbox[node].written(round):
+                senders.append(node)
+                    
+        return senders
      
     # FOR INTERNAL USE ONLY
-    # dict: sending node -> list[(msg, port)] becomes dict: receiving node -> list[(msg, port)]
+    # moves messages of the sending nodes from their outbox slots to the inbox slots of the receivers.
+    # A broadcast is expanded here: every receiver gets a reference to the same message
+    # object in its inbox slot.
+    # Returns list of receiving nodes
     def mapOutgoingToIncoming(self, outgoing):
-        incoming = {}
-        for index, node in enumerate(outgoing.keys()):
-            for msg in outgoing[node]:
-                (adj, j) = node.getAdjacentByPortNumber(msg[1])
-                addOrAppend(incoming, adj, (msg[0], j))
+        round = self.messageRound
+        inbox = self.inbox
+        receivers = []
         
-        return incoming
+        def deliver(adj, j, msg):
+            slots = inbox[adj]
+            if slots.round != round:
+                receivers.append(adj)
+            slots.put(round, j, msg)
+            
+        for node in outgoing:
+            routes = self.routes[node]
+            slots = self.outbox[node]
+            
+            if slots.broadcastRound == round:
+                broadcast = slots.broadcast
+                for (port, (adj, j)) in routes.items():
+                    if slots.stamps[port] == round:
+                        deliver(adj, j, slots.messages[port])
+                    else:
+                        deliver(adj, j, broadcast)
+            else:
+                for port in slots.ports:
+                    (adj, j) = routes[port]
+                    deliver(adj, j, slots.messages[port])
+                    
+        return receivers
         
     # FOR INTERNAL USE ONLY
+    # keeps count of nodes in stopping states up to date
     def setNewStateBasedOnMessages(self, node, V):
-        self.afterRoundStates[node] = self.receive(node.name, self.beforeRoundStates[node], V, node.degree())
+        before = self.beforeRoundStates[node]
+        after = self.receive(self.graph.nodeName(node), before, V, self.graph.nodeDegree(node))
+        self.afterRoundStates[node] = after
+        
+        if after.id in self.stoppingIds:
+            self.stoppedCount += 1
+        if before.id in self.stoppingIds:
+            self.stoppedCount -= 1
+        
+    def inStoppingState(self, state):
+        return state.id in self.stoppingIds
         
     # FOR INTERNAL USE ONLY
-    def allNodesInStoppingState(self, states):
-        if len(states) == 0:
-            return False
+    # stopped is the number of nodes in stopping states, out of all nodes with a state
+    def allNodesStopped(self, stopped):
+        n = len(self.beforeRoundStates)
+        return (n > 0) and (stopped == n)
         
-        stoppingStates = self.output()
-        for state in states.values():
-            if not stateInStoppingStates(state, stoppingStates):
-                return False
-                
-        return True
+    # fraction of nodes in stopping states after the latest round, for progress reporting
+    def fractionHalted(self):
+        n = len(self.beforeRoundStates)
+        if n == 0:
+            return 0.0
+        return self.stoppedCount / n
+        
+    # attaches a state received from another process to this algorithm
+    def adoptState(self, state):
+        state.alg = self
+        return state
         
     # to be called always before running simulation, since the underlying graph might
     # have changed..
@@ -305,10 +597,31 @@ class DistributedAlgorithm(ABC):
         self.running = False
         self.beforeRoundStates = {}
         self.afterRoundStates = {}
+        self.routes = {}
+        self.outbox = {}
+        self.inbox = {}
+        self.messageRound = 0
+        self.active = {}
+        self.stoppingIds = set()
+        self.stoppedCount = 0
+        self.stoppedBeforeRound = 0
         self.virtual = virtual
         
-        if virtual:
-            self.initializeVirtual()
+        # subset of nodes run by this instance, see parallelEngine
+        self.shard = None
+        
+        # times the phases of the rounds when set, see profiler.py
+        self.profiler = None
+        
+        # counts the messages of the rounds when set, see messageCounter.py
+        self.messageCounter = None
+        
+        # writes the rounds to a trace file when set, see traceFile.py
+        self.tracer = None
+        
+        # built by initializeVirtual when a run starts
+        self.virtualNetwork = None
+        self.virtualProblem = None
         
     def __str__(self):
         return self.desc
@@ -318,6 +631,13 @@ class DistributedAlgorithm(ABC):
         self.running = False
         self.beforeRoundStates = {}
         self.afterRoundStates = {}
+        self.routes = {}
+        self.outbox = {}
+        self.inbox = {}
+        self.messageRound = 0
+        self.active = {}
+        self.stoppedCount = 0
+        self.stoppedBeforeRound = 0
         
-        if self.virtual:
+        if self.virtualProblem != None:
             self.virtualProblem.reset()
\ No newline at end of file
@@ -0,0 +1,212 @@
+
+# Generators for port-numbered benchmark graphs. The graphs are built directly from
+# edge lists, without node positions or collision checks.
+#
+# Every generator takes
+#   ports:   'canonical' numbers the ports of a node in the order its edges are generated,
+#            'random' uses a random permutation of 1..deg for every node
+#   seed:    seed for the structure of random graphs and for random port numbering
+#   compact: True returns compactGraph.CompactGraph, False returns a virtual graph.Graph
+#
+# Bipartite graphs are colored with colors 1 and 2 so that they pass
+# BipartiteMaximalMatching.validateInput, other graphs are left uncolored (0).
+
+import math
+import random
+
+from compactGraph import CompactGraph
+
+# FOR INTERNAL USE ONLY
+# Fisher-Yates shuffle on rnd.random(), much faster than random.shuffle for the
+# millions of short lists of port numbers
+def shuffle(items, rnd):
+    random = rnd.random
+    for i in range(len(items) - 1, 0, -1):
+        j = int(random() * (i + 1))
+        (items[i], items[j]) = (items[j], items[i])
+
+# FOR INTERNAL USE ONLY
+# pairs is list of (node1, node2), returns the graph with port numbering applied
+def build(n, pairs, colors, ports, rnd, compact):
+    degrees = [0] * n
+    edges = []
+    for (u, v) in pairs:
+        degrees[u] += 1
+        degrees[v] += 1
+        edges.append((u, degrees[u], v, degrees[v]))
+
+    if ports == 'random':
+        permutations = []
+        for d in degrees:
+            permutation = list(range(1, d + 1))
+            shuffle(permutation, rnd)
+            permutations.append(permutation)
+
+        edges = [(u, permutations[u][i - 1], v, permutations[v][j - 1]) for (u, i, v, j) in edges]
+    elif ports != 'canonical':
+        raise Exception('unknown port numbering ' + str(ports) + ', use canonical or random')
+
+    graph = CompactGraph.fromPortEdges(n, edges, colors)
+    if compact:
+        return graph
+    return graph.toGraph()
+
+# random bipartite graph with n1 + n2 nodes and m distinct edges, nodes 0..n1-1 colored 1
+def randomBipartite(n1, n2, m, ports = 'random', seed = None, compact = True):
+    if m > n1 * n2:
+        raise Exception('too many edges for a bipartite graph')
+
+    rnd = random.Random(seed)
+    seen = set()
+    pairs = []
+    while len(pairs) < m:
+        u = int(rnd.random() * n1)
+        v = n1 + int(rnd.random() * n2)
+        if (u, v) not in seen:
+            seen.add((u, v))
+            pairs.append((u, v))
+
+    colors = [1] * n1 + [2] * n2
+    return build(n1 + n2, pairs, colors, ports, rnd, compact)
+
+# random d-regular graph on n nodes by the configuration model: the d copies of every
+# node are paired at random, and self-loops and repeated edges are then removed by
+# switching them with random edges, which keeps every degree at d
+def regular(n, d, ports = 'random', seed = None, compact = True):
+    if (d >= n) or ((n * d) % 2 != 0):
+        raise Exception('no ' + str(d) + '-regular graph on ' + str(n) + ' nodes')
+
+    rnd = random.Random(seed)
+    draw = rnd.random
+
+    def key(u, v):
+        return (u, v) if u < v else (v, u)
+
+    while True:
+        stubs = [v for v in range(n) for k in range(d)]
+        shuffle(stubs, rnd)
+        pairs = [(stubs[i], stubs[i + 1]) for i in range(0, len(stubs), 2)]
+
+        counts = {}
+        for (u, v) in pairs:
+            counts[key(u, v)] = counts.get(key(u, v), 0) + 1
+
+        def remove(u, v):
+            counts[key(u, v)] -= 1
+            if counts[key(u, v)] == 0:
+                del counts[key(u, v)]
+
+        bad = [i for (i, (u, v)) in enumerate(pairs) if u == v or counts[key(u, v)] > 1]
+
+        # small dense graphs can get stuck, those are started again from scratch
+        attempts = 100 * len(bad) + 1000
+        while len(bad) > 0 and attempts > 0:
+            attempts -= 1
+            i = bad.pop()
+            (u, v) = pairs[i]
+            if u != v and counts[key(u, v)] == 1:
+                continue
+
+            j = int(draw() * len(pairs))
+            (x, y) = pairs[j]
+            if draw() < 0.5:
+                (x, y) = (y, x)
+
+            # replace u-v and x-y with u-x and v-y
+            if u == x or v == y or key(u, x) in counts or key(v, y) in counts or key(u, x) == key(v, y):
+                bad.append(i)
+                continue
+
+            remove(u, v)
+            remove(x, y)
+            counts[key(u, x)] = 1
+            counts[key(v, y)] = 1
+            pairs[i] = (u, x)
+            pairs[j] = (v, y)
+
+        if len(bad) == 0:
+            return build(n, pairs, [0] * n, ports, rnd, compact)
+
+# rows x cols grid, node of row i and column j is i * cols + j. A torus wraps around
+# both dimensions and requires at least 3 rows and columns.
+# Colored as a chess board when bipartite (always for grids, even dimensions for tori)
+def grid(rows, cols, torus = False, ports = 'canonical', seed = None, compact = True):
+    if torus and (rows < 3 or cols < 3):
+        raise Exception('torus requires at least 3 rows and columns')
+
+    pairs = []
+    for i in range(rows):
+        for j in range(cols):
+            v = i * cols + j
+            if j + 1 < cols:
+                pairs.append((v, v + 1))
+            elif torus:
+                pairs.append((v, i * cols))
+            if i + 1 < rows:
+                pairs.append((v, v + cols))
+            elif torus:
+                pairs.append((v, j))
+
+    if (not torus) or (rows % 2 == 0 and cols % 2 == 0):
+        colors = [((i + j) % 2) + 1 for i in range(rows) for j in range(cols)]
+    else:
+        colors = [0] * (rows * cols)
+
+    return build(rows * cols, pairs, colors, ports, random.Random(seed), compact)
+
+def torus(rows, cols, ports = 'canonical', seed = None, compact = True):
+    return grid(rows, cols, True, ports, seed, compact)
+
+# star with center 0 (color 1) and leaves 1..leaves (color 2)
+def star(leaves, ports = 'canonical', seed = None, compact = True):
+    pairs = [(0, v) for v in range(1, leaves + 1)]
+    colors = [1] + [2] * leaves
+    return build(leaves + 1, pairs, colors, ports, random.Random(seed), compact)
+
+# Erdős–Rényi G(n, p), generated by skipping over absent edges with geometric jumps
+# so that the work is proportional to the number of edges
+def erdosRenyi(n, p, ports = 'random', seed = None, compact = True):
+    rnd = random.Random(seed)
+    pairs = []
+
+    if p >= 1:
+        pairs = [(u, v) for v in range(n) for u in range(v)]
+    elif p > 0:
+        logq = math.log(1 - p)
+        v = 1
+        u = -1
+        while v < n:
+            u += 1 + int(math.log(1 - rnd.random()) / logq)
+            while u >= v and v < n:
+                u -= v
+                v += 1
+            if v < n:
+                pairs.append((u, v))
+
+    return build(n, pairs, [0] * n, ports, rnd, compact)
+
+# power-law graph by Barabási–Albert preferential attachment: starts from a clique
+# of m + 1 nodes, every further node attaches to m distinct existing nodes
+def powerLaw(n, m, ports = 'random', seed = None, compact = True):
+    if m < 1 or n < m + 1:
+        raise Exception('power-law graph requires 1 <= m < n')
+
+    rnd = random.Random(seed)
+    pairs = [(u, v) for v in range(m + 1) for u in range(v)]
+
+    # every node appears once per incident edge, sampling from it is proportional to degree
+    endpoints = []
+    for (u, v) in pairs:
+        endpoints.append(u)
+        endpoints.append(v)
+
+    for v in range(m + 1, n):
+        targets = set()
+        while len(targets) < m:
+            targets.add(endpoints[int(rnd.random() * len(endpoints))])
+        for u in targets:
+            pairs.append((u, v))
+            endpoints.append(u)
+            endpoints.append(v)
+
+    return build(n, pairs, [0] * n, ports, rnd, compact)
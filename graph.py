@@ -1,6 +1,8 @@
 
 import string
 import math
+import gc
+from contextlib import contextmanager
 
 circle_radius = 20
 minimum_distance_between_nodes = 5 * circle_radius
@@ -11,6 +13,23 @@ class Graph:
         self.edges = []
         self.virtual = isVirtual
         
+        # adjacency index: node -> dict(port -> edge)
+        self.adjacency = {}
+        
+        # lookup tables: name -> list of nodes, frozenset(node1, node2) -> edge
+        self.nodesByName = {}
+        self.edgesByNodes = {}
+        
+        # spatial index of the nodes with a position: grid cell -> list of nodes, the cells
+        # are squares of size minimum_distance_between_nodes, see cellOf
+        self.nodesByCell = {}
+        
+        # increased on every change of nodes, edges, port numbers, names or colors, so that
+        # data derived from the graph can be reused until the graph changes, see cached
+        self.version = 0
+        self.derived = {}
+        self.derivedVersion = 0
+        
     def addNode(self, pos = None, color = 0, addName = True):
         nodeName = 'N/A'
         if addName and (len(self.nodes) < len(string.ascii_uppercase)):
@@ -28,103 +47,311 @@ class Graph:
         if self.canAddNode(pos):
             node = Node(self, nodeName, pos, color)
             self.nodes.append(node)
+            self.adjacency[node] = {}
+            self.indexName(node, None, nodeName)
+            self.indexPosition(node, None, pos)
+            self.version += 1
             return node
                   
+    # adds count nodes at once, returns list of the new nodes. colors, names and positions
+    # are optional lists with a value per node. Without names, the nodes are named by
+    # their index in the graph, skipping names which are taken. Nothing is added if a
+    # position collides (see canAddNode)
+    def addNodes(self, count, colors = None, names = None, positions = None):
+        if not self.virtual:
+            # positions of the new nodes by grid cell
+            accepted = {}
+            for pos in (positions or []):
+                if pos == None:
+                    continue
+                if (not self.canAddNode(pos)) or any(tooClose(pos, other) for other in nearby(accepted, pos)):
+                    raise Exception('can not add node to position ' + str(pos))
+                accepted.setdefault(cellOf(pos), []).append(pos)
+        
+        nodes = []
+        index = len(self.nodes)
+        with collectorPaused():
+            for i in range(count):
+                color = 0 if colors == None else colors[i]
+                if names == None:
+                    while self.nameInGraph(str(index)):
+                        index += 1
+                    name = str(index)
+                else:
+                    name = names[i]
+                pos = None if positions == None else positions[i]
+                
+                node = Node(self, name, pos, color)
+                self.nodes.append(node)
+                self.adjacency[node] = {}
+                self.indexName(node, None, name)
+                self.indexPosition(node, None, pos)
+                nodes.append(node)
+            
+        self.version += 1
+        return nodes
+        
     def deleteNode(self, node):
-        self.nodes.remove(node)
-      
-        edgesToRemove = node.edges()
+        self.deleteNodes([node])
+        
+    # deletes the nodes and their edges in O(N + E), and compacts the port numbers of the
+    # remaining nodes which had a removed edge back to 1..deg
+    def deleteNodes(self, nodes):
+        deleted = set(nodes)
+        removedEdges = set()
         nodesToCheckPortNumbering = set()
-        for edge in edgesToRemove:
-            for e in self.edges:
-                if e.sameAs(edge):
-                    anotherNode = edge.nodes() - set([node])
-                    
-                    if len(nodesToCheckPortNumbering) == 0:
-                        nodesToCheckPortNumbering = anotherNode
-                    else:
-                        nodesToCheckPortNumbering.update( anotherNode )
+        
+        for node in deleted:
+            for edge in node.edges():
+                if edge in removedEdges:
+                    continue
+                removedEdges.add(edge)
+                del self.edgesByNodes[frozenset(edge.nodes())]
+                
+                anotherNode = edge.getAdjacentNode(node)
+                if anotherNode not in deleted:
+                    del self.adjacency[anotherNode][edge.portNumberForNode(anotherNode)]
+                    nodesToCheckPortNumbering.add(anotherNode)
                     
-                    self.edges.remove(e)
-                    break
+        for node in deleted:
+            del self.adjacency[node]
+            self.indexName(node, node.name, None)
+            self.indexPosition(node, node.pos, None)
+            
+        self.nodes = [node for node in self.nodes if node not in deleted]
+        if len(removedEdges) > 0:
+            self.edges = [edge for edge in self.edges if edge not in removedEdges]
+        self.version += 1
          
-        # decrease the port numbers of those nodes which had the removed edge
-        for node in list(nodesToCheckPortNumbering):
+        # decrease the port numbers of those nodes which had a removed edge
+        for node in nodesToCheckPortNumbering:
             node.updatePortNumbering()
          
     # case sensitive match
     def nodeByName(self, name):
-        return next((x for x in self.nodes if x.name == name), None)
+        nodes = self.nodesByName.get(name)
+        return nodes[0] if nodes else None
                
+    # the edge gets the next free port numbers, use addEdges for explicit port numbers.
+    # Edges without port numbering (-1) are indexed once they get a port number
     def addEdge(self, node1, node2, addPortNumbering = True):
         if not self.hasEdgeWithNodes(node1, node2):
             if addPortNumbering:
-                edge = UndirectedEdge(self, node1, node1.degree() + 1, node2, node2.degree() + 1)
+                (port1, port2) = (node1.degree() + 1, node2.degree() + 1)
             else:
-                edge = UndirectedEdge(self, node1, -1, node2, -1)
+                (port1, port2) = (-1, -1)
                 
+            edge = UndirectedEdge(self, node1, port1, node2, port2)
             self.edges.append(edge)
+            self.edgesByNodes[frozenset((node1, node2))] = edge
+            self.indexPort(node1, port1, edge)
+            self.indexPort(node2, port2, edge)
+            self.version += 1
             return edge
             
+    # adds edges at once, edges is an iterable of (node1, node2) which get the next free
+    # port numbers, or (node1, port1, node2, port2). Returns list of the new edges.
+    # Nothing is added if an edge exists already or a port number is taken
+    def addEdges(self, edges):
+        adjacency = self.adjacency
+        edgesByNodes = self.edgesByNodes
+        result = []
+        
+        with collectorPaused():
+            for edge in edges:
+                if len(edge) == 4:
+                    (node1, port1, node2, port2) = edge
+                else:
+                    (node1, node2) = edge
+                    port1 = len(adjacency[node1]) + 1
+                    port2 = len(adjacency[node2]) + 1
+                    
+                pair = frozenset((node1, node2))
+                ports1 = adjacency[node1]
+                ports2 = adjacency[node2]
+                if (pair in edgesByNodes) or (port1 in ports1) or (port2 in ports2) or (node1 is node2 and port1 == port2):
+                    problem = 'port numbers ' + str((port1, port2)) + ' of the edge between ' + node1.name + ' and ' + node2.name + ' are taken'
+                    if pair in edgesByNodes:
+                        problem = 'edge between ' + node1.name + ' and ' + node2.name + ' exists already'
+                    self.removeAddedEdges(result)
+                    raise Exception(problem)
+                    
+                edge = UndirectedEdge(self, node1, port1, node2, port2)
+                edgesByNodes[pair] = edge
+                ports1[port1] = edge
+                ports2[port2] = edge
+                result.append(edge)
+                
+            self.edges.extend(result)
+            
+        self.version += 1
+        return result
+        
+    # FOR INTERNAL USE ONLY
+    # undoes addEdges up to an invalid edge
+    def removeAddedEdges(self, edges):
+        for edge in edges:
+            del self.edgesByNodes[frozenset(edge.nodes())]
+            for (node, port) in edge.nodesWithPorts:
+                del self.adjacency[node][port]
+            
+    # FOR INTERNAL USE ONLY
+    def indexPort(self, node, port, edge):
+        if port != -1:
+            self.adjacency[node][port] = edge
+            
+    # FOR INTERNAL USE ONLY
+    def indexName(self, node, oldName, newName):
+        if oldName != None:
+            nodes = self.nodesByName[oldName]
+            nodes.remove(node)
+            if len(nodes) == 0:
+                del self.nodesByName[oldName]
+                
+        if newName != None:
+            self.nodesByName.setdefault(newName, []).append(node)
+            
+    # FOR INTERNAL USE ONLY
+    def indexPosition(self, node, oldPos, newPos):
+        if oldPos != None:
+            cell = cellOf(oldPos)
+            nodes = self.nodesByCell[cell]
+            nodes.remove(node)
+            if len(nodes) == 0:
+                del self.nodesByCell[cell]
+                
+        if newPos != None:
+            self.nodesByCell.setdefault(cellOf(newPos), []).append(node)
+            
     def hasEdgeWithNodes(self, node1, node2):
-        return next((x for x in self.edges if set(x.nodes()) == set([node1, node2])), None) != None
+        return frozenset((node1, node2)) in self.edgesByNodes
         
     # node can be added if the position does not collide with existing nodes (actually we have a bit space between the nodes to make the graph more clear!)
     # OR if the graph is virtual (no UI)
+    # OR if the node has no position.
+    # Only the nodes in the grid cells around the position are checked
     def canAddNode(self, pos): 
-        if self.virtual:
+        if self.virtual or pos == None:
             return True
     
-        for node in self.nodes:
-            xd = pow(node.pos[0] - pos[0], 2)
-            yd = pow(node.pos[1] - pos[1], 2)
-            d = math.sqrt(xd + yd)
-            if d < minimum_distance_between_nodes:
+        for node in nearby(self.nodesByCell, pos):
+            if tooClose(node.pos, pos):
                 return False
         
         return True
         
     def nameInGraph(self, name):
-        item = next((x for x in self.nodes if x.name == name), None)
-        return (item != None)
+        return name in self.nodesByName
         
+    # Only the nodes in the grid cells around the position are checked. If the circles
+    # of several nodes contain the position, the node added first is returned
     def nodeInPos(self, pos):
         if self.virtual:
             return None
     
-        for node in self.nodes:
+        hits = []
+        for node in nearby(self.nodesByCell, pos):
             xInside = ((node.pos[0] - circle_radius) <= pos[0]) and (pos[0] <= (node.pos[0] + circle_radius))
             yInside = ((node.pos[1] - circle_radius) <= pos[1]) and (pos[1] <= (node.pos[1] + circle_radius))
             if xInside and yInside:
-                return node
+                hits.append(node)
                 
-        return None
+        if len(hits) == 0:
+            return None
+        if len(hits) == 1:
+            return hits[0]
+        return min(hits, key = self.nodes.index)
         
     def colorsInGraph(self):
-        return set(map(lambda x: x.color, self.nodes))
+        return self.cached('colorsInGraph', lambda: set(map(lambda x: x.color, self.nodes)))
+        
+    # returns the data derived from the graph by build(), memoized under key until the
+    # version of the graph changes. The returned data is shared, it must not be modified
+    def cached(self, key, build):
+        if self.derivedVersion != self.version:
+            self.derived = {}
+            self.derivedVersion = self.version
+            
+        if key not in self.derived:
+            self.derived[key] = build()
+        return self.derived[key]
+        
+    # derived data is not pickled, it is rebuilt when needed
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['derived'] = {}
+        return state
+        
+    # graph interface shared with compactGraph.CompactGraph, used by the distributed algorithms
+        
+    def nodeName(self, node):
+        return node.name
+        
+    def nodeColor(self, node):
+        return node.color
+        
+    def nodeDegree(self, node):
+        return node.degree()
+        
+    def nodePorts(self, node):
+        return node.portNumbering()
+        
+    # returns tuple (node, port)
+    def adjacentByPortNumber(self, node, port):
+        return node.getAdjacentByPortNumber(port)
         
         
 class Node:
     def __init__(self, graph, name, pos = None, color = 0):
         self.graph = graph
-        self.name = name
-        self.pos = pos
-        self.color = color
+        self.nodeName = name
+        self.nodePos = pos
+        self.nodeColor = color
         
     def __str__(self):
         return self.name
         
+    # renaming keeps the name lookup table of the graph in sync
+    @property
+    def name(self):
+        return self.nodeName
+        
+    @name.setter
+    def name(self, name):
+        if self in self.graph.adjacency:
+            self.graph.indexName(self, self.nodeName, name)
+            self.graph.version += 1
+        self.nodeName = name
+        
+    # moving keeps the spatial index of the graph in sync
+    @property
+    def pos(self):
+        return self.nodePos
+        
+    @pos.setter
+    def pos(self, pos):
+        if self in self.graph.adjacency:
+            self.graph.indexPosition(self, self.nodePos, pos)
+        self.nodePos = pos
+        
+    @property
+    def color(self):
+        return self.nodeColor
+        
+    @color.setter
+    def color(self, color):
+        if self in self.graph.adjacency:
+            self.graph.version += 1
+        self.nodeColor = color
+        
     def degree(self):
-        return len(self.edges())
+        return len(self.graph.adjacency[self])
      
     def edges(self):
-        return list(filter(lambda a: self in a.nodes(), self.graph.edges))
+        return list(self.graph.adjacency[self].values())
         
     def edgeByPortNumber(self, port):
-        for edge in self.edges():
-            if edge.portNumberForNode(self) == port:
-                return edge
-        return None
+        return self.graph.adjacency[self].get(port)
         
     # returns tuple (node, port)
     def getAdjacentByPortNumber(self, port):
@@ -137,21 +364,21 @@ class Node:
         return max(self.portNumbering(), default = 0)
     
     def portNumbering(self):
-        return list(map(lambda a: a.portNumberForNode(self), self.edges() ))
+        return list(self.graph.adjacency[self].keys())
               
+    # fills the holes in the port numbers 1..deg with the highest port numbers, the
+    # highest one going to the lowest hole
     def updatePortNumbering(self):
-        if self.graph.virtual:
-            return
-   
-        if self.degree() < self.numberOfPorts():
-            for i in range(1, self.degree() + 1):
-                if not self.hasPortNumber(i):
-                    edge = self.edgeByPortNumber(self.numberOfPorts())
-                    edge.newPortNumberForNode(self, i)
-                    return
+        d = self.degree()
+        if d < self.numberOfPorts():
+            holes = [i for i in range(1, d + 1) if not self.hasPortNumber(i)]
+            highest = sorted([port for port in self.portNumbering() if port > d], reverse = True)
+            for (i, port) in zip(holes, highest):
+                edge = self.edgeByPortNumber(port)
+                edge.newPortNumberForNode(self, i)
         
     def hasPortNumber(self, port):
-        return port in self.portNumbering()
+        return port in self.graph.adjacency[self]
           
 class UndirectedEdge:
     def __init__(self, graph, node1, node1Port, node2, node2Port):
@@ -181,15 +408,56 @@ class UndirectedEdge:
             raise Exception('Node does not belong to edge')
             
     def newPortNumberForNode(self, node, port):
+        oldPort = self.portNumberForNode(node)
+        
         if node == self.node0WithPort()[0]:
             self.nodesWithPorts[0] = (self.nodesWithPorts[0][0], port)
-        elif node == self.node1WithPort()[0]:
-            self.nodesWithPorts[1] = (self.nodesWithPorts[1][0], port)
         else:
-            raise Exception('Node does not belong to edge')
+            self.nodesWithPorts[1] = (self.nodesWithPorts[1][0], port)
+            
+        ports = self.graph.adjacency[node]
+        if ports.get(oldPort) is self:
+            del ports[oldPort]
+        self.graph.indexPort(node, port, self)
+        self.graph.version += 1
     
     def nodes(self):
         return set(map(lambda a: a[0], self.nodesWithPorts))
         
     def sameAs(self, edge):
-        return set(self.nodes()) == set(edge.nodes())
\ No newline at end of file
+        return set(self.nodes()) == set(edge.nodes())
+
+# FOR INTERNAL USE ONLY
+# nodes at the positions would be closer than minimum_distance_between_nodes
+def tooClose(pos1, pos2):
+    xd = pos1[0] - pos2[0]
+    yd = pos1[1] - pos2[1]
+    return xd * xd + yd * yd < minimum_distance_between_nodes * minimum_distance_between_nodes
+    
+# FOR INTERNAL USE ONLY
+# grid cell of the position in the spatial index of Graph
+def cellOf(pos):
+    return (math.floor(pos[0] / minimum_distance_between_nodes), math.floor(pos[1] / minimum_distance_between_nodes))
+    
+# FOR INTERNAL USE ONLY
+# entries of the grid cells around the position. The cells are at least as large as the
+# collision distance and the circles of the nodes, so the 3x3 cells around the position
+# contain every node the position can collide with or hit
+def nearby(grid, pos):
+    (x, y) = cellOf(pos)
+    for cx in (x - 1, x, x + 1):
+        for cy in (y - 1, y, y + 1):
+            yield from grid.get((cx, cy), ())
+
+# FOR INTERNAL USE ONLY
+# pauses the cyclic garbage collector while many objects are created at once, since
+# its passes over the growing graph would take most of the time
+@contextmanager
+def collectorPaused():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
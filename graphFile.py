@@ -0,0 +1,193 @@
+
+# Binary graph files. A file is a 64 byte header followed by fixed-width little-endian
+# arrays, each starting at a multiple of 8 bytes:
+#
+#   header        magic b'PNGRAPH\0', version (uint32), flags (uint32), number of
+#                 nodes n (uint64), number of port slots s = 2 * edges (uint64),
+#                 length of the names in bytes (uint64)
+#   colors        int32[n]
+#   offsets       int64[n + 1]     CSR offsets, see compactGraph.CompactGraph
+#   neighbor      int32[s]
+#   neighborPort  int32[s]
+#   nameOffsets   int64[n + 1]     if flags has NAMES, names are UTF-8 strings
+#   names         bytes
+#   positions     float64[2 * n]   if flags has POSITIONS, x and y of the nodes
+#
+#   save(graph, 'graph.pngraph')
+#   graph = load('graph.pngraph')
+#
+# load memory-maps the file, so opening a graph does not read it and the pages are
+# shared between processes which load the same file. A loaded graph is pickled as its
+# path, so worker processes (see parallelEngine and sweep) map the same file.
+
+import mmap
+import struct
+import sys
+from array import array
+
+from graph import Graph
+from compactGraph import CompactGraph
+
+MAGIC = b'PNGRAPH\0'
+VERSION = 1
+
+# flags
+NAMES = 1
+POSITIONS = 2
+
+HEADER = struct.Struct('<8sIIQQQ')
+HEADER_SIZE = 64
+
+# CompactGraph backed by a memory-mapped graph file
+class MappedGraph(CompactGraph):
+
+    def __init__(self, path, offsets, neighbor, neighborPort, colors, names, positions):
+        CompactGraph.__init__(self, offsets, neighbor, neighborPort, colors, names)
+        self.path = path
+
+        # x, y, x, y, ... of the nodes, or None
+        self.positions = positions
+
+    def __reduce__(self):
+        return (load, (self.path,))
+
+    def nodePosition(self, v):
+        if self.positions == None:
+            return None
+        return (self.positions[2 * v], self.positions[2 * v + 1])
+
+# node names of a graph file, decoded when accessed
+class MappedNames:
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, v):
+        return bytes(self.data[self.offsets[v]:self.offsets[v + 1]]).decode('utf-8')
+
+# FOR INTERNAL USE ONLY
+def padding(length):
+    return (8 - length % 8) % 8
+
+# FOR INTERNAL USE ONLY
+def writeArray(f, code, values):
+    values = array(code, values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    data = values.tobytes()
+    f.write(data)
+    f.write(bytes(padding(len(data))))
+
+# graph is graph.Graph or compactGraph.CompactGraph. Node positions of a non-virtual
+# graph.Graph (the playground) are saved too
+def save(graph, path):
+    positions = None
+    if isinstance(graph, Graph):
+        if (not graph.virtual) and all(node.pos != None for node in graph.nodes):
+            positions = [float(coordinate) for node in graph.nodes for coordinate in node.pos]
+        graph = CompactGraph.fromGraph(graph)
+    elif isinstance(graph, MappedGraph):
+        positions = graph.positions
+
+    n = graph.numberOfNodes()
+    flags = 0
+
+    names = None
+    nameOffsets = None
+    if graph.names != None:
+        flags |= NAMES
+        encoded = [graph.nodeName(v).encode('utf-8') for v in graph.nodes]
+        names = b''.join(encoded)
+        nameOffsets = [0]
+        for name in encoded:
+            nameOffsets.append(nameOffsets[-1] + len(name))
+
+    if positions != None:
+        flags |= POSITIONS
+
+    with open(path, 'wb') as f:
+        header = HEADER.pack(MAGIC, VERSION, flags, n, len(graph.neighbor), len(names or b''))
+        f.write(header)
+        f.write(bytes(HEADER_SIZE - len(header)))
+
+        writeArray(f, 'i', graph.colors)
+        writeArray(f, 'q', graph.offsets)
+        writeArray(f, 'i', graph.neighbor)
+        writeArray(f, 'i', graph.neighborPort)
+
+        if names != None:
+            writeArray(f, 'q', nameOffsets)
+            f.write(names)
+            f.write(bytes(padding(len(names))))
+
+        if positions != None:
+            writeArray(f, 'd', positions)
+
+# returns MappedGraph
+def load(path):
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+    view = memoryview(data)
+    if len(view) < HEADER_SIZE:
+        raise Exception(path + ' is not a graph file')
+
+    (magic, version, flags, n, slots, nameBytes) = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise Exception(path + ' is not a graph file')
+    if version != VERSION:
+        raise Exception('unsupported graph file version ' + str(version))
+
+    position = HEADER_SIZE
+
+    # returns typed view of the next count items and moves past them
+    def section(code, count):
+        nonlocal position
+        size = array(code).itemsize * count
+        if position + size > len(view):
+            raise Exception(path + ' is truncated')
+
+        values = view[position:position + size]
+        position += size + padding(size)
+
+        # memory-mapped views are only possible in the byte order of the file
+        if code == 'B':
+            return values
+        if sys.byteorder != 'little':
+            values = array(code, values.tobytes())
+            values.byteswap()
+            return values
+        return values.cast(code)
+
+    colors = section('i', n)
+    offsets = section('q', n + 1)
+    neighbor = section('i', slots)
+    neighborPort = section('i', slots)
+
+    names = None
+    if flags & NAMES:
+        nameOffsets = section('q', n + 1)
+        names = MappedNames(nameOffsets, section('B', nameBytes))
+
+    positions = None
+    if flags & POSITIONS:
+        positions = section('d', 2 * n)
+
+    return MappedGraph(path, offsets, neighbor, neighborPort, colors, names, positions)
+
+# loads the file as graph.Graph. With node positions in the file the graph is not
+# virtual, so that it can be edited in the playground
+def loadGraph(path):
+    mapped = load(path)
+    graph = mapped.toGraph()
+
+    if mapped.positions != None:
+        graph.virtual = False
+        for (v, node) in enumerate(graph.nodes):
+            node.pos = mapped.nodePosition(v)
+
+    return graph
@@ -0,0 +1,118 @@
+
+import math
+
+from distributedAlgorithm import SIM_EMPTY_MESSAGE
+
+# Counts the messages of a DistributedAlgorithm round by round, as they are routed:
+# the messages delivered, the broadcasts (messages to all ports, counted once per
+# sending node), the messages per port number and their estimated size in bits.
+#
+#   counter = MessageCounter()
+#   counter.attach(algorithm)
+#   ... run the algorithm ...
+#   counter.totals['bits']
+#
+# A message is encoded with ceil(log2(|msg()|)) bits. In a simulated algorithm every
+# message carries one message for each virtual copy, and a copy can also send nothing,
+# so a message takes twice ceil(log2(|msg()| + 1)) bits of the virtual problem. For
+# simulated algorithms the messages and bits are also counted per virtual copy.
+#
+# rounds is the list of per round counts of the latest run and totals sums them up,
+# a new run starts on the first round of the algorithm.
+# An algorithm without a counter only checks for it once per round.
+class MessageCounter:
+
+    def __init__(self):
+        self.rounds = []
+        self.totals = newTotals(False)
+
+    def attach(self, algorithm):
+        algorithm.messageCounter = self
+
+    def detach(self, algorithm):
+        algorithm.messageCounter = None
+
+    # FOR INTERNAL USE ONLY
+    # counts the messages which the outgoing nodes sent in the current round
+    def count(self, algorithm, outgoing):
+        virtual = algorithm.virtual
+        if algorithm.counter == 0:
+            self.rounds = []
+            self.totals = newTotals(virtual)
+
+        if virtual:
+            copyBits = bitsFor(len(algorithm.virtualProblem.msg()) + 1)
+            bits = 2 * copyBits
+        else:
+            bits = bitsFor(len(algorithm.msg()))
+
+        round = algorithm.messageRound
+        counts = newCounts(virtual)
+        counts['round'] = algorithm.counter + 1
+        ports = counts['ports']
+        copies = [0, 0]
+
+        for node in outgoing:
+            slots = algorithm.outbox[node]
+            if slots.broadcastRound == round:
+                counts['broadcasts'] += 1
+                sent = []
+                for port in algorithm.routes[node]:
+                    if slots.stamps[port] == round:
+                        sent.append((port, slots.messages[port]))
+                    else:
+                        sent.append((port, slots.broadcast))
+            else:
+                sent = [(port, slots.messages[port]) for port in slots.ports]
+
+            counts['messages'] += len(sent)
+            for (port, msg) in sent:
+                ports[port] = ports.get(port, 0) + 1
+                if virtual:
+                    if msg[0] != SIM_EMPTY_MESSAGE:
+                        copies[0] += 1
+                    if msg[1] != SIM_EMPTY_MESSAGE:
+                        copies[1] += 1
+
+        counts['bits'] = counts['messages'] * bits
+        if virtual:
+            for (copy, messages) in enumerate(copies):
+                counts['copies'][copy + 1] = {'messages': messages, 'bits': messages * copyBits}
+
+        self.rounds.append(counts)
+        self.add(counts)
+
+    # FOR INTERNAL USE ONLY
+    def add(self, counts):
+        totals = self.totals
+        for key in ('messages', 'broadcasts', 'bits'):
+            totals[key] += counts[key]
+        totals['maxMessages'] = max(totals['maxMessages'], counts['messages'])
+
+        for (port, messages) in counts['ports'].items():
+            totals['ports'][port] = totals['ports'].get(port, 0) + messages
+
+        for (copy, copyCounts) in counts.get('copies', {}).items():
+            for key in ('messages', 'bits'):
+                totals['copies'][copy][key] += copyCounts[key]
+
+# FOR INTERNAL USE ONLY
+def newCounts(virtual):
+    counts = {'messages': 0, 'broadcasts': 0, 'bits': 0, 'ports': {}}
+    if virtual:
+        counts['copies'] = {1: {'messages': 0, 'bits': 0}, 2: {'messages': 0, 'bits': 0}}
+    return counts
+
+# FOR INTERNAL USE ONLY
+# totals also have the largest number of messages in a round
+def newTotals(virtual):
+    totals = newCounts(virtual)
+    totals['maxMessages'] = 0
+    return totals
+
+# FOR INTERNAL USE ONLY
+# bits needed to tell apart the given number of messages
+def bitsFor(alphabetSize):
+    if alphabetSize <= 1:
+        return 0
+    return math.ceil(math.log2(alphabetSize))
@@ -0,0 +1,192 @@
+
+import bisect
+import multiprocessing
+
+from graph import Graph
+from compactGraph import CompactGraph
+
+# Runs a DistributedAlgorithm in bulk synchronous parallel fashion on a CompactGraph.
+# The nodes are partitioned into shards of contiguous node ranges and every shard is run
+# by its own worker process. In a round each worker sends the messages of its nodes,
+# messages to nodes of other shards are exchanged through the main process at the
+# round barrier, and then each worker runs receive for its nodes. Results are identical
+# to the sequential runOneRound.
+class ParallelEngine:
+
+    def __init__(self, algorithmClass, graph, processes = None, context = None):
+        if isinstance(graph, Graph):
+            graph = CompactGraph.fromGraph(graph)
+
+        self.algorithmClass = algorithmClass
+        self.graph = graph
+        self.processes = processes or multiprocessing.cpu_count()
+        self.context = context or multiprocessing.get_context()
+
+        # used for validating the input and for the states collected from the workers
+        self.algorithm = algorithmClass(graph)
+        self.desc = str(self.algorithm) + ' (parallel)'
+
+        self.boundaries = partition(graph, self.processes)
+        self.workers = []
+        self.reset()
+
+    def __str__(self):
+        return self.desc
+
+    def reset(self):
+        self.close()
+        self.counter = 0
+        self.running = False
+        self.stoppedCount = 0
+
+    # stops the worker processes
+    def close(self):
+        for (process, connection) in self.workers:
+            connection.send(('stop', None))
+            process.join()
+            connection.close()
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # FOR INTERNAL USE ONLY
+    def startWorkers(self):
+        for index in range(len(self.boundaries) - 1):
+            shard = range(self.boundaries[index], self.boundaries[index + 1])
+            (connection, workerConnection) = self.context.Pipe()
+            process = self.context.Process(target = shardWorker, args = (workerConnection, self.algorithmClass, self.graph, shard), daemon = True)
+            process.start()
+            workerConnection.close()
+            self.workers.append((process, connection))
+
+    # FOR INTERNAL USE ONLY
+    def shardOf(self, node):
+        return bisect.bisect_right(self.boundaries, node) - 1
+
+    def runOneRound(self):
+        if not self.running:
+            if self.counter > 0:
+                print('Running tried even though all nodes are in stopped states!')
+                return
+
+            if not self.algorithm.validateInput():
+                print('The input graph does not meet the requirements')
+                return
+
+            self.startWorkers()
+            self.running = True
+
+        # send phase, collect messages crossing the shard boundaries
+        for (process, connection) in self.workers:
+            connection.send(('send', None))
+
+        incoming = [[] for worker in self.workers]
+        for (process, connection) in self.workers:
+            for (adj, j, msg) in connection.recv():
+                incoming[self.shardOf(adj)].append((adj, j, msg))
+
+        # receive phase
+        for index, (process, connection) in enumerate(self.workers):
+            connection.send(('receive', incoming[index]))
+
+        self.stoppedCount = 0
+        for (process, connection) in self.workers:
+            self.stoppedCount += connection.recv()
+
+        self.counter += 1
+
+        if self.stoppedCount == self.graph.numberOfNodes():
+            self.running = False
+
+    def fractionHalted(self):
+        n = self.graph.numberOfNodes()
+        if n == 0:
+            return 0.0
+        return self.stoppedCount / n
+
+    # returns dict: node -> state after the latest round, collected from the workers
+    def collectStates(self):
+        states = {}
+        for (process, connection) in self.workers:
+            connection.send(('states', None))
+        for (process, connection) in self.workers:
+            for (node, state) in connection.recv().items():
+                states[node] = self.algorithm.adoptState(state)
+        return states
+
+    # same as DistributedAlgorithm.afterRoundStates, collected on every access
+    @property
+    def afterRoundStates(self):
+        return self.collectStates()
+
+# contiguous node ranges with roughly equal number of ports + nodes in each,
+# returns list of shard boundaries [0, ..., n]
+def partition(graph, shards):
+    n = graph.numberOfNodes()
+    shards = max(1, min(shards, n))
+    total = graph.offsets[n] + n
+
+    boundaries = [0]
+    for v in range(n):
+        if (graph.offsets[v] + v) * shards >= total * len(boundaries) and v > boundaries[-1]:
+            boundaries.append(v)
+            if len(boundaries) == shards:
+                break
+    boundaries.append(n)
+    return boundaries
+
+# FOR INTERNAL USE ONLY
+# worker process running the nodes of a single shard
+def shardWorker(connection, algorithmClass, graph, shard):
+    alg = algorithmClass(graph)
+    alg.shard = shard
+    start = shard.start
+    stop = shard.stop
+
+    while True:
+        (command, argument) = connection.recv()
+
+        if command == 'send':
+            alg.startRound()
+            if alg.virtual:
+                alg.virtualProblem.startRound()
+
+            alg.messageRound += 1
+            round = alg.messageRound
+            alg.localReceivers = []
+
+            remote = []
+            for node in alg.sendMessages():
+                if start <= node < stop:
+                    alg.localReceivers.append(node)
+                else:
+                    for (msg, j) in alg.inbox[node].received(round):
+                        remote.append((node, j, msg))
+
+            connection.send(remote)
+
+        elif command == 'receive':
+            round = alg.messageRound
+            receivers = alg.localReceivers
+            for (node, j, msg) in argument:
+                slots = alg.inbox[node]
+                if slots.round != round:
+                    receivers.append(node)
+                slots.put(round, j, msg)
+
+            alg.receiveMessages(receivers)
+            connection.send(alg.stoppedCount)
+
+        elif command == 'states':
+            states = {}
+            for node in shard:
+                states[node] = alg.afterRoundStates[node]
+            connection.send(states)
+
+        elif command == 'stop':
+            connection.close()
+            return
@@ -1,11 +1,12 @@
 
 import pygame as pg
-import sys, math
+import sys, math, os
 from pygame.locals import *
 
 from graph import *
 from algorithms import *
 from UIcomponents import *
+import graphFile
 
 (width, height) = (1200, 600)
 
@@ -47,6 +48,9 @@ running = True
 running_algo = False
 selected_node = None
 
+# graph file for saving (key S) and loading (key L), can be given as the first argument
+graphPath = sys.argv[1] if len(sys.argv) > 1 else 'graph.pngraph'
+
 problems = [BipartiteMaximalMatching(graph), MinimumVertexCover3Approximation(graph)]
 buttons = []
 
@@ -96,6 +100,35 @@ def clearUI(emptyDropdown):
 def nextRound():
     if running_algo:
         selectedProblem().runOneRound()
+        
+def saveGraph():
+    graphFile.save(graph, graphPath)
+    print('Graph saved to ' + graphPath)
+    
+def loadGraph():
+    global graph, selected_node
+    
+    if not os.path.exists(graphPath):
+        print('Graph file ' + graphPath + ' does not exist')
+        return
+        
+    graph = graphFile.loadGraph(graphPath)
+    
+    # graphs saved without positions are placed on a circle
+    if graph.virtual:
+        graph.virtual = False
+        center = (playgroundBorderX / 2, height / 2)
+        radius = min(center) - 2 * circle_radius
+        for index, node in enumerate(graph.nodes):
+            angle = 2 * math.pi * index / len(graph.nodes)
+            node.pos = (center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle))
+            
+    for node in graph.nodes:
+        node.pos = (int(node.pos[0]), int(node.pos[1]))
+    
+    for problem in problems:
+        problem.graph = graph
+    selected_node = None
 
 buttons[0].action = run_algo
 buttons[1].action = lambda: clearUI(True)
@@ -159,6 +192,10 @@ def main():
                     if selected_node != None:
                         selected_node.color = 0
                         selected_node = None
+                elif event.key == K_s:
+                    saveGraph()
+                elif event.key == K_l:
+                    loadGraph()
                         
             updateScreen()
             
@@ -260,6 +297,8 @@ def exit_app():
     sys.exit()
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        loadGraph()
     main()
     exit_app()
     
\ No newline at end of file
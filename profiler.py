@@ -0,0 +1,116 @@
+
+import time
+
+# order in which the phases of a round are run
+PHASES = ['initialize', 'swap', 'construct', 'route', 'count', 'receive', 'trace', 'halt']
+
+# Times the phases of the rounds of a DistributedAlgorithm:
+#   initialize  initializeInternalState on the first round of a run
+#   swap        moving the states of the previous round to beforeRoundStates
+#   construct   constructOutgoingMessages
+#   route       mapOutgoingToIncoming
+#   count       counting the messages, with a messageCounter.MessageCounter attached
+#   receive     the receive loop
+#   trace       writing the round, with a traceFile.TraceWriter attached
+#   halt        the halting check
+#
+#   profiler = RoundProfiler(perNode = True)
+#   profiler.attach(algorithm)
+#   ... run the algorithm ...
+#   print(profiler.summary())
+#
+# Callbacks are called after every round with (algorithm, round, timings), timings is a
+# dict phase -> seconds. Timings are also aggregated per run in totals, a new run starts
+# whenever the algorithm initializes its states.
+# With perNode, the time spent in send and receive is summed per node name, to find
+# the hot vertices.
+# An algorithm without a profiler only checks for it a few times per round.
+class RoundProfiler:
+
+    def __init__(self, perNode = False, callbacks = None):
+        self.perNode = perNode
+        self.callbacks = list(callbacks or [])
+        self.runs = []
+        self.timings = {}
+        self.last = 0.0
+
+    def attach(self, algorithm):
+        algorithm.profiler = self
+        if self.perNode:
+            algorithm.send = timedByNode(algorithm.send, self)
+            algorithm.receive = timedByNode(algorithm.receive, self)
+
+    def detach(self, algorithm):
+        algorithm.profiler = None
+        for name in ('send', 'receive'):
+            if name in algorithm.__dict__:
+                delattr(algorithm, name)
+
+    # timings of the latest run: dict with rounds (list of timings per round),
+    # totals (phase -> seconds) and nodes (node name -> seconds, with perNode)
+    @property
+    def run(self):
+        if len(self.runs) == 0:
+            self.runs.append({'rounds': [], 'totals': {}, 'nodes': {}})
+        return self.runs[-1]
+
+    # FOR INTERNAL USE ONLY
+    def startRound(self):
+        self.timings = {}
+        self.last = time.perf_counter()
+
+    # FOR INTERNAL USE ONLY
+    # the time since the previous mark is spent in the given phase
+    def mark(self, phase):
+        now = time.perf_counter()
+        if phase == 'initialize':
+            self.runs.append({'rounds': [], 'totals': {}, 'nodes': {}})
+        self.timings[phase] = self.timings.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    # FOR INTERNAL USE ONLY
+    def endRound(self, algorithm):
+        run = self.run
+        run['rounds'].append(self.timings)
+        for (phase, seconds) in self.timings.items():
+            run['totals'][phase] = run['totals'].get(phase, 0.0) + seconds
+
+        for callback in self.callbacks:
+            callback(algorithm, algorithm.counter, self.timings)
+
+    # FOR INTERNAL USE ONLY
+    def addNodeTime(self, nodeName, seconds):
+        nodes = self.run['nodes']
+        nodes[nodeName] = nodes.get(nodeName, 0.0) + seconds
+
+    # returns list of (node name, seconds) of the latest run, slowest first
+    def hottestNodes(self, count = 10):
+        nodes = sorted(self.run['nodes'].items(), key = lambda a: a[1], reverse = True)
+        return nodes[:count]
+
+    # phase totals of the latest run as text
+    def summary(self):
+        run = self.run
+        total = sum(run['totals'].values())
+        lines = ['rounds: ' + str(len(run['rounds']))]
+        for phase in PHASES:
+            if phase in run['totals']:
+                seconds = run['totals'][phase]
+                share = seconds / total if total > 0 else 0.0
+                lines.append(phase.ljust(11) + format(seconds, '.6f').rjust(12) + ' s ' + format(share, '.1%').rjust(7))
+
+        if self.perNode:
+            lines.append('hottest nodes:')
+            for (name, seconds) in self.hottestNodes():
+                lines.append('  ' + str(name).ljust(9) + format(seconds, '.6f').rjust(12) + ' s')
+        return '\n'.join(lines)
+
+# FOR INTERNAL USE ONLY
+# wraps send or receive of an algorithm, both take the node name as the first argument
+def timedByNode(function, profiler):
+    def timed(nodeName, *args):
+        start = time.perf_counter()
+        result = function(nodeName, *args)
+        profiler.addNodeTime(nodeName, time.perf_counter() - start)
+        return result
+    return timed
@@ -0,0 +1,117 @@
+
+# Parameter sweeps: runs many independent simulations in a process pool and collects
+# the results into one table.
+#
+#   jobs = [(BipartiteMaximalMatching, myGraphFactory, seed) for seed in range(100)]
+#   rows = sweep(jobs, processes = 8)
+#
+# A job is a tuple (algorithm class, graph factory, seed), the graph is built in the
+# worker by calling graphFactory(seed). Factories have to be picklable, for example
+# module level functions or functools.partial of them.
+
+import concurrent.futures
+import os
+import time
+
+from batchRunner import run
+
+def describe(factory):
+    if hasattr(factory, 'func'):
+        factory = factory.func
+    return getattr(factory, '__name__', repr(factory))
+
+COLUMNS = ('buildSeconds', 'nodes', 'validInput', 'halted', 'rounds', 'seconds', 'outputs')
+
+# FOR INTERNAL USE ONLY
+# every row has all the columns, None where a value is missing
+def emptyRow(index, job, error):
+    (algorithmClass, graphFactory, seed) = job
+    row = {
+        'job': index,
+        'algorithm': algorithmClass.__name__,
+        'graph': describe(graphFactory),
+        'seed': seed,
+        'error': error,
+    }
+    for key in COLUMNS:
+        row[key] = None
+    return row
+
+# FOR INTERNAL USE ONLY
+# runs a single job, errors are reported in the row instead of raised
+def runJob(index, job, maxRounds):
+    (algorithmClass, graphFactory, seed) = job
+    row = emptyRow(index, job, None)
+
+    try:
+        start = time.perf_counter()
+        graph = graphFactory(seed)
+        row['buildSeconds'] = time.perf_counter() - start
+
+        result = run(algorithmClass(graph), maxRounds)
+        for key in COLUMNS[1:]:
+            row[key] = result[key]
+    except Exception as e:
+        row['error'] = repr(e)
+
+    return row
+
+# FOR INTERNAL USE ONLY
+def runChunk(chunk, maxRounds):
+    return [runJob(index, job, maxRounds) for (index, job) in chunk]
+
+def crashedRow(index, job):
+    return emptyRow(index, job, 'worker process crashed')
+
+# FOR INTERNAL USE ONLY
+# runs function(*args) in a process of its own, returns None if the process crashed
+def runIsolated(function, *args):
+    try:
+        with concurrent.futures.ProcessPoolExecutor(1) as pool:
+            return pool.submit(function, *args).result()
+    except concurrent.futures.process.BrokenProcessPool:
+        return None
+
+# Runs the jobs in a pool of processes, chunkSize jobs at a time per worker.
+# Returns list of result rows (dicts) in the order of the jobs.
+# A crashing worker breaks the whole pool, so the chunks which did not finish are run
+# again, up to processes at a time, each in a process of its own. Only the jobs of the
+# chunks which crash again are run one by one, so that just the job which crashed is
+# reported as failed.
+def sweep(jobs, processes = None, chunkSize = 1, maxRounds = 10000):
+    processes = processes or os.cpu_count()
+    jobs = list(enumerate(jobs))
+    chunks = [jobs[i:i + chunkSize] for i in range(0, len(jobs), chunkSize)]
+    rows = {}
+    broken = []
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        futures = {}
+        for chunk in chunks:
+            futures[pool.submit(runChunk, chunk, maxRounds)] = chunk
+
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                for row in future.result():
+                    rows[row['job']] = row
+            except concurrent.futures.process.BrokenProcessPool:
+                broken.append(futures[future])
+
+    if len(broken) > 0:
+        with concurrent.futures.ThreadPoolExecutor(processes) as threads:
+            crashed = []
+            results = threads.map(lambda chunk: runIsolated(runChunk, chunk, maxRounds), broken)
+            for (chunk, result) in zip(broken, results):
+                if result == None:
+                    crashed.extend(chunk)
+                else:
+                    for row in result:
+                        rows[row['job']] = row
+
+            results = threads.map(lambda item: runIsolated(runJob, item[0], item[1], maxRounds), crashed)
+            for ((index, job), row) in zip(crashed, results):
+                if row == None:
+                    row = crashedRow(index, job)
+                rows[index] = row
+
+    return [rows[index] for index in sorted(rows)]
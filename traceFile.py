@@ -0,0 +1,154 @@
+
+# Round traces: the state changes and messages of every round, streamed to a gzip
+# compressed file while the algorithm runs, and read back one round at a time.
+#
+#   with TraceWriter('run.trace.gz') as tracer:
+#       tracer.attach(algorithm)
+#       ... run the algorithm ...
+#
+#   for (round, states) in TraceReader('run.trace.gz').replay():
+#       ...
+#
+# The file is JSON lines, a record per line. Every run starts with a run record with the
+# node names and the initial states of all nodes, followed by a round record per round
+# with the nodes whose state changed in the round and the messages sent in the round:
+#
+#   {"type": "run", "algorithm": desc, "nodes": n, "names": [...], "states": [[node, state], ...]}
+#   {"type": "round", "round": r, "states": [[node, state], ...], "messages": [[node, port, msg], ...]}
+#
+# Nodes are numbered by their index in the graph and states are written as shown in the
+# UI. A message to port ALLPORTS is a message to all ports, a message to a single port
+# in the same round overrides it on that port.
+# The writer only holds the messages of the current round, and an algorithm without
+# a tracer only checks for it twice per round.
+
+import gzip
+import json
+import zlib
+
+from distributedAlgorithm import ALLPORTS
+
+# The records are flushed to the file every flushEvery rounds, so that the trace of a
+# crashed run can be read up to the latest flush
+class TraceWriter:
+
+    def __init__(self, path, flushEvery = 100):
+        self.path = path
+        self.flushEvery = flushEvery
+        self.file = gzip.open(path, 'wt', encoding = 'utf-8')
+        self.index = None
+        self.messages = []
+        self.rounds = 0
+
+    def attach(self, algorithm):
+        algorithm.tracer = self
+
+    def detach(self, algorithm):
+        algorithm.tracer = None
+
+    def close(self):
+        if self.file != None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # FOR INTERNAL USE ONLY
+    def write(self, record):
+        self.file.write(json.dumps(record, separators = (',', ':')))
+        self.file.write('\n')
+
+    # FOR INTERNAL USE ONLY
+    # index of the node in the graph, nodes of a CompactGraph are their own index
+    def nodeId(self, node):
+        if self.index == None:
+            return node
+        return self.index[node]
+
+    # FOR INTERNAL USE ONLY
+    def startRun(self, algorithm):
+        graph = algorithm.graph
+        self.index = None
+        if not isinstance(graph.nodes, range):
+            self.index = {node: v for (v, node) in enumerate(graph.nodes)}
+
+        states = algorithm.beforeRoundStates
+        self.write({
+            'type': 'run',
+            'algorithm': str(algorithm),
+            'nodes': len(graph.nodes),
+            'names': [graph.nodeName(node) for node in graph.nodes],
+            'states': [[self.nodeId(node), str(states[node])] for node in states],
+        })
+
+    # FOR INTERNAL USE ONLY
+    # records the messages which the outgoing nodes sent in the current round
+    def sent(self, algorithm, outgoing):
+        if algorithm.counter == 0:
+            self.startRun(algorithm)
+
+        round = algorithm.messageRound
+        messages = []
+        for node in outgoing:
+            slots = algorithm.outbox[node]
+            v = self.nodeId(node)
+            if slots.broadcastRound == round:
+                messages.append([v, ALLPORTS, slots.broadcast])
+            if slots.round == round:
+                for port in slots.ports:
+                    messages.append([v, port, slots.messages[port]])
+        self.messages = messages
+
+    # FOR INTERNAL USE ONLY
+    # writes the round, nodes are the nodes which ran receive in the round
+    def received(self, algorithm, nodes):
+        before = algorithm.beforeRoundStates
+        after = algorithm.afterRoundStates
+
+        changes = []
+        for node in nodes:
+            state = str(after[node])
+            if state != str(before[node]):
+                changes.append([self.nodeId(node), state])
+
+        self.write({'type': 'round', 'round': algorithm.counter + 1, 'states': changes, 'messages': self.messages})
+        self.messages = []
+
+        self.rounds += 1
+        if self.rounds % self.flushEvery == 0:
+            self.file.flush()
+
+# Reads a trace lazily, one record at a time
+class TraceReader:
+
+    def __init__(self, path):
+        self.path = path
+
+    # yields the records of the file as dicts. A trace which was not closed ends at the
+    # latest flush
+    def __iter__(self):
+        with gzip.open(self.path, 'rt', encoding = 'utf-8') as f:
+            try:
+                for line in f:
+                    if line.endswith('\n'):
+                        yield json.loads(line)
+            except (EOFError, zlib.error):
+                return
+
+    # yields (round, states) after every round of every run, states is dict
+    # node -> state and starts from the initial states of the run with round 0.
+    # The same dict is updated in place, copy it to keep the states of a round
+    def replay(self):
+        states = {}
+        for record in self:
+            if record['type'] == 'run':
+                states = dict(record['states'])
+                yield (0, states)
+            else:
+                for (node, state) in record['states']:
+                    states[node] = state
+                yield (record['round'], states)
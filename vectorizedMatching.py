@@ -0,0 +1,199 @@
+
+import numpy as np
+
+from graph import Graph
+from compactGraph import CompactGraph
+from algorithms import BipartiteMaximalMatching
+from bipartite import twoColoring
+
+# state encodings, same states as in algorithms.BipartiteMaximalMatching
+WUR = 0
+BUR = 1
+MR = 2
+US = 3
+MS = 4
+
+# Bipartite maximal matching where one round is computed for the whole network with
+# NumPy array operations over a CompactGraph. Gives the same results as
+# algorithms.BipartiteMaximalMatching, which is used as the reference.
+#
+# All running nodes share the round counter r, so it is not stored per node. The sets
+# M and X of the black nodes are kept per CSR slot: X as a boolean array, M as the
+# slots which received a proposal in the previous (odd) round, since a black node with
+# nonempty M stops in the next (even) round.
+class VectorizedBipartiteMaximalMatching:
+
+    def __init__(self, graph):
+        if isinstance(graph, Graph):
+            graph = CompactGraph.fromGraph(graph)
+
+        self.graph = graph
+        self.desc = "Bipartite Maximal Matching (vectorized)"
+        self.reference = None
+
+        self.offsets = np.asarray(graph.offsets, dtype = np.int64)
+        self.neighbor = np.asarray(graph.neighbor, dtype = np.int64)
+        self.neighborPort = np.asarray(graph.neighborPort, dtype = np.int64)
+        self.colors = np.asarray(graph.colors)
+        self.degrees = np.diff(self.offsets)
+
+        n = len(self.degrees)
+        self.owner = np.repeat(np.arange(n), self.degrees)
+        self.reverse = self.offsets[self.neighbor] + self.neighborPort - 1
+
+        self.reset()
+
+    def __str__(self):
+        return self.desc
+
+    def reset(self):
+        self.counter = 0
+        self.running = False
+        self.state = None
+
+    # a graph without colors (all colors 0) is colored automatically if it is bipartite,
+    # like in algorithms.BipartiteMaximalMatching
+    def validateInput(self):
+        if len(self.colors) > 0 and not np.any(self.colors):
+            (coloring, oddCycle) = twoColoring(self.graph)
+            if coloring == None:
+                return False
+            self.colors = np.asarray(coloring)
+            return True
+            
+        twoColors = len(np.unique(self.colors)) == 2
+        bipartiness = not np.any(self.colors[self.owner] == self.colors[self.neighbor])
+        return twoColors and bipartiness
+
+    # FOR INTERNAL USE ONLY
+    def initializeInternalState(self):
+        white = self.colors == self.colors.min()
+
+        self.state = np.where(white, WUR, BUR).astype(np.int8)
+        self.i = np.full(len(self.degrees), -1, dtype = np.int64)
+        self.inX = ~white[self.owner]
+        self.xCount = np.where(white, 0, self.degrees)
+        self.pendingM = np.zeros(0, dtype = np.int64)
+
+    def runOneRound(self):
+        if not self.running:
+            if self.state is not None:
+                print('Running tried even though all nodes are in stopped states!')
+                return
+
+            if not self.validateInput():
+                print('The input graph does not meet the requirements')
+                return
+
+            self.initializeInternalState()
+            self.running = True
+
+        r = self.counter + 1
+        if r % 2 != 0:
+            self.oddRound(r)
+        else:
+            self.evenRound()
+
+        self.counter += 1
+
+        if self.allNodesInStoppingState():
+            self.running = False
+
+    def allNodesInStoppingState(self):
+        return not np.any(self.state < US)
+
+    # FOR INTERNAL USE ONLY
+    # slot indices of all ports of the given nodes
+    def slotsOfNodes(self, nodes):
+        lengths = self.degrees[nodes]
+        shift = self.offsets[nodes] - (np.cumsum(lengths) - lengths)
+        return np.arange(lengths.sum()) + np.repeat(shift, lengths)
+
+    # FOR INTERNAL USE ONLY
+    # white nodes propose, matched white nodes announce MATCHED to all ports
+    def oddRound(self, r):
+        k = (r + 1) // 2
+        state = self.state
+
+        waiting = state == WUR
+        proposers = np.flatnonzero(waiting & (k <= self.degrees))
+        stopping = np.flatnonzero(waiting & (k > self.degrees))
+        matched = np.flatnonzero(state == MR)
+
+        # PROPOSAL to port k, received by black nodes still running
+        proposals = self.reverse[self.offsets[proposers] + k - 1]
+        self.pendingM = np.sort(proposals[state[self.owner[proposals]] == BUR])
+
+        # MATCHED to all ports, removes the port from X of the receiver
+        announced = self.reverse[self.slotsOfNodes(matched)]
+        announced = announced[self.inX[announced] & (state[self.owner[announced]] == BUR)]
+        self.inX[announced] = False
+        np.subtract.at(self.xCount, self.owner[announced], 1)
+
+        state[stopping] = US
+        state[matched] = MS
+
+    # FOR INTERNAL USE ONLY
+    # black nodes accept the proposal with the smallest port number
+    def evenRound(self):
+        state = self.state
+
+        acceptors, first = np.unique(self.owner[self.pendingM], return_index = True)
+        acceptSlots = self.pendingM[first]
+        self.pendingM = np.zeros(0, dtype = np.int64)
+
+        accepted = self.reverse[acceptSlots]
+        accepted = accepted[state[self.owner[accepted]] == WUR]
+        whites = self.owner[accepted]
+
+        state[whites] = MR
+        self.i[whites] = accepted - self.offsets[whites] + 1
+
+        state[acceptors] = MS
+        self.i[acceptors] = acceptSlots - self.offsets[acceptors] + 1
+
+        state[(state == BUR) & (self.xCount == 0)] = US
+
+    # returns dict: node -> State of algorithms.BipartiteMaximalMatching after the latest round
+    def currentStates(self):
+        if self.state is None:
+            return {}
+
+        if self.reference == None:
+            self.reference = BipartiteMaximalMatching(self.graph)
+        alg = self.reference
+
+        r = self.counter + 1
+        M = {}
+        if r % 2 == 0:
+            for slot in self.pendingM:
+                v = self.owner[slot]
+                M.setdefault(v, set()).add(int(slot - self.offsets[v] + 1))
+
+        states = {}
+        for v in self.graph.nodes:
+            code = self.state[v]
+            if code == WUR:
+                result = alg.WUR.copy(alg)
+                result.r = r
+            elif code == BUR:
+                start = self.offsets[v]
+                ports = np.flatnonzero(self.inX[start:self.offsets[v + 1]]) + 1
+
+                result = alg.BUR.copy(alg)
+                result.r = r
+                result.M = M.get(v, set())
+                result.X = set(ports.tolist())
+            elif code == MR:
+                result = alg.MR.copy(alg)
+                result.r = r
+                result.i = int(self.i[v])
+            elif code == US:
+                result = alg.US.copy(alg)
+            else:
+                result = alg.MS.copy(alg)
+                result.i = int(self.i[v])
+
+            states[v] = result
+
+        return states